@@ -0,0 +1,94 @@
+"""Entry points: python -m package demo <alias> | importtime | bench | compare <old> <new> | test"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+from . import modules
+
+_package = __package__
+_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def demo(alias):
+    """Run the demos of one file, as running the file itself would."""
+    import runpy
+    runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), modules[alias]),
+                   run_name='__main__')
+
+
+def import_time(name):
+    """Return the cumulative microseconds `python -X importtime` reports for importing name,
+    or None if the import failed."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + name],
+                            cwd=_parent, capture_output=True, text=True)
+    if result.returncode:
+        return None
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s*\d+ \|\s*(\d+) \| ( *)(\S+)$', line)
+        if match and match.group(3) == name:
+            return int(match.group(1))
+
+
+def import_times():
+    """Print the import time of the package, and of each file loaded through it."""
+    names = [_package] + [_package + '.' + alias for alias in sorted(modules)]
+    for name in names:
+        us = import_time(name)
+        print('{0:55s} {1}'.format(name, 'failed' if us is None else '{0:8.2f} ms'.format(us / 1000)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ' + _package)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('demo', help="run one file's demos").add_argument('alias', choices=sorted(modules))
+    commands.add_parser('importtime', help='import the package and each file, and time it')
+    bench = commands.add_parser('bench', help='time each benchmark case over its input sizes')
+    bench.add_argument('-k', dest='pattern', help='only cases whose name matches this regular expression')
+    bench.add_argument('--quick', action='store_true', help='fewer sizes and samples')
+    bench.add_argument('--repeat', type=int, default=5, help='samples per size')
+    bench.add_argument('--warmup', type=int, default=1, help='samples discarded before those')
+    bench.add_argument('-o', dest='output', help='write the results to this JSON file')
+    compare = commands.add_parser('compare', help='report regressions between two bench -o results')
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=0.1,
+                         help='flag a median that grew by more than this fraction (default 0.1)')
+    test = commands.add_parser('test', help="run every file's doctests in parallel processes")
+    test.add_argument('-k', dest='pattern', help='only files whose name matches this regular expression')
+    test.add_argument('--workers', type=int, help='files run at once (default: the number of CPUs)')
+    test.add_argument('--timeout', type=float, default=120.0, help='seconds allowed per file (default 120)')
+    test.add_argument('--slowest', type=int, default=10, help='list this many slowest tests')
+    test.add_argument('--no-cache', dest='cache', action='store_false',
+                      help='rerun files that passed before and have not changed')
+    args = parser.parse_args(argv)
+    if args.command == 'demo':
+        demo(args.alias)
+    elif args.command == 'importtime':
+        import_times()
+    elif args.command == 'bench':
+        from . import benchmarks
+        results = benchmarks.run(args.pattern, args.quick, args.repeat, args.warmup)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=1)
+    elif args.command == 'compare':
+        from . import benchmarks
+        if benchmarks.compare_files(args.old, args.new, args.threshold):
+            sys.exit(1)
+    elif args.command == 'test':
+        from . import doctests
+        results = doctests.run(args.pattern, args.workers, args.timeout, args.cache)
+        if args.slowest:
+            print('slowest tests:')
+            for seconds, name in doctests.slowest(results, args.slowest):
+                print('{0:8.3f} s  {1}'.format(seconds, name))
+        if any(result['status'] not in ('ok', 'cached') for result in results.values()):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,502 @@
+"""Benchmarks for the public functions of each file, over sweeps of input sizes.
+
+Each case is a setup function registered with @case: given a size n, it builds its input
+(untimed) and returns a thunk, which is what gets timed. A thunk must be safe to call
+repeatedly, since short ones are called many times per sample.
+
+    python -m package bench [-k PATTERN] [--quick] [-o results.json]
+    python -m package compare old.json new.json [--threshold 0.1]
+
+For every size the harness calibrates a loop count so one sample takes at least min_time,
+discards warmup samples, then records repeat samples, reported per call. Over the sweep it
+fits t ~ c * n**k by least squares on log t against log n; k estimates the complexity
+exponent (about 1 for linear work, 2 for quadratic, and growing with n for exponential).
+"""
+
+import importlib
+import json
+import platform
+import re
+import statistics
+import sys
+import time
+import types
+from itertools import islice
+from math import exp, log
+
+cases = {}  # name -> (setup, sizes)
+
+
+def case(name, sizes):
+    """Register a setup function as the benchmark name, run at each size in sizes."""
+    def register(setup):
+        cases[name] = (setup, tuple(sizes))
+        return setup
+    return register
+
+
+def load(alias):
+    """Return the file loaded under alias, as in `from package import alias`."""
+    return importlib.import_module(__package__ + '.' + alias)
+
+
+def measure(thunk, repeat=5, warmup=1, min_time=0.005, clock=time.perf_counter):
+    """Return (number, samples): seconds per call of thunk, from repeat samples of number calls.
+
+    >>> number, samples = measure(lambda: sum(range(100)), repeat=3, min_time=0.001)
+    >>> number > 1, len(samples)
+    (True, 3)
+    """
+    number = 1
+    while True:  # calibration doubles as the first warmup
+        start = clock()
+        for _ in range(number):
+            thunk()
+        elapsed = clock() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    samples = []
+    for i in range(warmup + repeat):
+        start = clock()
+        for _ in range(number):
+            thunk()
+        if i >= warmup:
+            samples.append((clock() - start) / number)
+    return number, samples
+
+
+def summarize(samples):
+    """Summary statistics of a list of seconds.
+
+    >>> summarize([1.0, 2.0, 3.0, 10.0])['median']
+    2.5
+    """
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'max': max(samples),
+    }
+
+
+def fit_exponent(sizes, times):
+    """Fit times ~ c * sizes**k by least squares in log-log space; return (k, c).
+
+    >>> k, c = fit_exponent([10, 100, 1000], [2e-3, 2e-1, 2e1])
+    >>> round(k, 6), round(c, 9)
+    (2.0, 2e-05)
+    """
+    xs, ys = [log(n) for n in sizes], [log(t) for t in times]
+    if len(xs) < 2:
+        return None, None
+    mx, my = statistics.mean(xs), statistics.mean(ys)
+    sxx = sum((x - mx) ** 2 for x in xs)
+    k = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx
+    return k, exp(my - k * mx)
+
+
+def run(pattern=None, quick=False, repeat=5, warmup=1, min_time=0.005, out=sys.stdout):
+    """Run every case whose name matches the regular expression pattern; return the results.
+
+    With quick, only the first three sizes of each case are run, with fewer samples.
+    """
+    if quick:
+        repeat, min_time = min(repeat, 3), min(min_time, 0.001)
+    results = {
+        'python': platform.python_implementation() + ' ' + platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cases': {},
+    }
+    for name, (setup, sizes) in cases.items():
+        if pattern and not re.search(pattern, name):
+            continue
+        if quick:
+            sizes = sizes[:3]
+        points = []
+        for n in sizes:
+            number, samples = measure(setup(n), repeat, warmup, min_time)
+            points.append(dict(n=n, number=number, **summarize(samples)))
+        k, c = fit_exponent([p['n'] for p in points], [p['median'] for p in points])
+        results['cases'][name] = {'points': points, 'exponent': k, 'coefficient': c}
+        if out:
+            print('{0:40s} k={1:5.2f}  '.format(name, k) +
+                  '  '.join('{0}:{1}'.format(p['n'], _format(p['median'])) for p in points),
+                  file=out)
+    return results
+
+
+def compare(old, new, threshold=0.1):
+    """Return (name, n, old median, new median, ratio) for each size run in both results
+    whose median grew by more than threshold.
+
+    >>> old = {'cases': {'f': {'points': [{'n': 10, 'median': 1.0}, {'n': 20, 'median': 2.0}]}}}
+    >>> new = {'cases': {'f': {'points': [{'n': 10, 'median': 1.05}, {'n': 20, 'median': 3.0}]}}}
+    >>> compare(old, new)
+    [('f', 20, 2.0, 3.0, 1.5)]
+    """
+    regressions = []
+    for name, result in new['cases'].items():
+        if name not in old['cases']:
+            continue
+        before = {p['n']: p['median'] for p in old['cases'][name]['points']}
+        for p in result['points']:
+            if p['n'] in before:
+                ratio = p['median'] / before[p['n']]
+                if ratio > 1 + threshold:
+                    regressions.append((name, p['n'], before[p['n']], p['median'], ratio))
+    return regressions
+
+
+def compare_files(old_path, new_path, threshold=0.1, out=sys.stdout):
+    """Print the regressions between two saved runs, and the change in fitted exponents;
+    return the number of regressions."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    for name in sorted(set(old['cases']) & set(new['cases'])):
+        k0, k1 = old['cases'][name]['exponent'], new['cases'][name]['exponent']
+        if k0 is not None and k1 is not None and abs(k1 - k0) > 0.25:
+            print('{0:40s} exponent {1:.2f} -> {2:.2f}'.format(name, k0, k1), file=out)
+    regressions = compare(old, new, threshold)
+    for name, n, before, after, ratio in regressions:
+        print('{0:40s} n={1:<8} {2} -> {3}  x{4:.2f}'.format(
+            name, n, _format(before), _format(after), ratio), file=out)
+    print('{0} regression(s) past {1:.0%}'.format(len(regressions), threshold), file=out)
+    return len(regressions)
+
+
+def _format(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{0:.3g}{1}'.format(seconds / scale, unit)
+    return '{0:.3g}ns'.format(seconds / 1e-9)
+
+
+# functions-recursive-functions.py
+
+@case('recursive.fib_iter', [250, 500, 1000, 2000, 4000])
+def _(n):
+    fib_iter = load('functions_recursive_functions').fib_iter
+    return lambda: fib_iter(n)
+
+
+@case('recursive.fib_plain', [12, 14, 16, 18, 20])
+def _(n):
+    m = load('functions_recursive_functions')
+    # fib is rebound to memo(fib); rebuild the original with its own name bound to itself
+    original = m.fib.__wrapped__
+    fib = types.FunctionType(original.__code__, dict(vars(m)), original.__name__)
+    fib.__globals__['fib'] = fib
+    return lambda: fib(n)
+
+
+@case('recursive.fib_memo_cold', [25, 50, 100, 200, 400])
+def _(n):
+    fib = load('functions_recursive_functions').fib
+
+    def cold():
+        fib.cache.clear()
+        return fib(n)
+    return cold
+
+
+@case('recursive.count_change', [25, 50, 100, 200])
+def _(n):
+    count_change = load('functions_recursive_functions').count_change
+    return lambda: count_change(n)
+
+
+@case('recursive.fast_exp', [10, 100, 1000, 10000])
+def _(n):
+    fast_exp = load('functions_recursive_functions').fast_exp
+    return lambda: fast_exp(3, n)
+
+
+# ch2-conventional-interface.py
+
+@case('conventional.sum_even_fibs', [25, 50, 100, 200, 400])
+def _(n):
+    sum_even_fibs = load('ch2_conventional_interface').sum_even_fibs
+    return lambda: sum_even_fibs(n)
+
+
+@case('conventional.acronym_stream', [1 << 10, 1 << 12, 1 << 14, 1 << 16])
+def _(n):
+    acronym_stream = load('ch2_conventional_interface').acronym_stream
+    text = ['University of California Berkeley '] * n
+    return lambda: sum(1 for _ in acronym_stream(text))
+
+
+# ch3-recursive-data-structure.py
+
+def _rlist(m, values):
+    s = m.Rlist.empty
+    for v in reversed(values):
+        s = m.Rlist(v, s)
+    return s
+
+
+@case('rlist.set_contains', [50, 100, 200, 400, 800])
+def _(n):
+    m = load('ch3_recursive_data_structure')
+    s = _rlist(m, list(range(n)))
+    return lambda: m.set_contains(s, -1)
+
+
+@case('rlist.intersect_set', [25, 50, 100, 200, 400])
+def _(n):
+    m = load('ch3_recursive_data_structure')
+    s, t = _rlist(m, list(range(n))), _rlist(m, list(range(0, 2 * n, 2)))
+    return lambda: m.intersect_set(s, t)
+
+
+@case('rlist.union_set', [25, 50, 100, 200, 400])
+def _(n):
+    m = load('ch3_recursive_data_structure')
+    s, t = _rlist(m, list(range(n))), _rlist(m, list(range(0, 2 * n, 2)))
+    return lambda: m.union_set(s, t)
+
+
+# data-sequences.py
+
+@case('sequences.dictionary', [100, 200, 400, 800, 1600])
+def _(n):
+    dictionary = load('data_sequences').dictionary
+
+    def fill():
+        d = dictionary()
+        for key in range(n):
+            d('setitem', key, key)
+        return d('getitem', n // 2)
+    return fill
+
+
+# data-abstraction.py
+
+@case('abstraction.add_rat', [25, 50, 100, 200, 400])
+def _(n):
+    m = load('data_abstraction')
+    terms = [m.make_rat(1, k) for k in range(1, n + 1)]
+
+    def harmonic():
+        total = m.make_rat(0, 1)
+        for term in terms:
+            total = m.add_rat(total, term)
+        return total
+    return harmonic
+
+
+@case('abstraction.mul_rat', [1000, 10000, 100000])
+def _(n):
+    m = load('data_abstraction')
+    terms = [m.make_rat(k, k + 1) for k in range(1, n + 1)]
+
+    def product():
+        total = m.make_rat(1, 1)
+        for term in terms:
+            total = m.mul_rat(total, term)
+        return total
+    return product
+
+
+# objects-recursive-objects.py
+# (filter_link is left out: it applies its predicate to the Link itself rather than to an element)
+
+def _link(m, values):
+    s = m.Link.empty
+    for v in reversed(values):
+        s = m.Link(v, s)
+    return s
+
+
+@case('link.map_link', [50, 100, 200, 400, 800])
+def _(n):
+    m = load('objects_recursive_objects')
+    s = _link(m, list(range(n)))
+    return lambda: m.map_link(abs, s)
+
+
+@case('link.extend_link', [50, 100, 200, 400, 800])
+def _(n):
+    m = load('objects_recursive_objects')
+    s = _link(m, list(range(n)))
+    return lambda: m.extend_link(s, s)
+
+
+@case('link.join_link', [50, 100, 200, 400, 800])
+def _(n):
+    m = load('objects_recursive_objects')
+    s = _link(m, list(range(n)))
+    return lambda: m.join_link(s, ', ')
+
+
+# objects-OOP-implement.py
+
+@case('oop_implement.account_deposit', [1000, 10000, 100000])
+def _(n):
+    m = load('objects_oop_implement')
+    account = m.Account['new']('Jim')
+    deposit = account['get']('deposit')
+
+    def deposits():
+        for _ in range(n):
+            deposit(1)
+    return deposits
+
+
+@case('oop_implement.make_class', [100, 1000, 10000])
+def _(n):
+    m = load('objects_oop_implement')
+
+    def classes():
+        for _ in range(n):
+            m.make_checking_account_class()['new']('Jack')
+    return classes
+
+
+# functions-higher-order-functions.py
+
+@case('higher_order.sum_pi', [1000, 10000, 100000, 1000000])
+def _(n):
+    sum_pi = load('functions_higher_order_functions').sum_pi
+    return lambda: sum_pi(n)
+
+
+@case('higher_order.square_root_newton', [10, 1000, 100000, 1000000])
+def _(n):
+    # of n * n: find_zero stops only at an absolute error of 1e-15, which the square root of
+    # a number that is not a perfect square never reaches
+    square_root_newton = load('functions_higher_order_functions').square_root_newton
+    return lambda: square_root_newton(n * n)
+
+
+# data-nonlocal-assignment.py
+
+@case('nonlocal.make_withdraw', [1000, 10000, 100000])
+def _(n):
+    make_withdraw = load('data_nonlocal_assignment').make_withdraw
+
+    def drain():
+        withdraw = make_withdraw(n)
+        for _ in range(n):
+            withdraw(1)
+    return drain
+
+
+# data-processing-streams.py
+
+@case('streams.map_filter', [1000, 4000, 16000, 64000])
+def _(n):
+    m = load('data_processing_streams')
+    return lambda: m.filter_stream(lambda x: x % 2, m.map_stream(lambda x: x * x,
+                                                               m.integer_stream(1))).take(n)
+
+
+@case('streams.pipeline_fused', [1000, 4000, 16000, 64000])
+def _(n):
+    m = load('data_processing_streams')
+    return lambda: (m.Pipeline(m.integer_stream(1)).map(lambda x: x * x)
+                    .filter(lambda x: x % 2).stream().take(n))
+
+
+@case('streams.block_stream', [1000, 4000, 16000, 64000])
+def _(n):
+    m = load('data_processing_streams')
+    return lambda: list(islice(m.block_values(m.filter_block_stream(
+        lambda x: x % 2, m.map_block_stream(lambda x: x * x, m.integer_block_stream(1)))), n))
+
+
+# ch3-interpreter-example-calculator.py
+
+@case('calculator.parse_eval', [100, 1000, 10000, 30000])
+def _(n):
+    m = load('ch3_interpreter_example_calculator')
+    line = '(+ ' + ' '.join('(* {0} 2)'.format(i) for i in range(n)) + ')'
+    return lambda: m.calc_eval(m.calc_parse(line))
+
+
+@case('calculator.compiled', [100, 1000, 10000, 100000])
+def _(n):
+    m = load('ch3_interpreter_example_calculator')
+    f = m.calc_compile(m.calc_parse('(+ ' + ' '.join('(* x {0})'.format(i) for i in range(n)) + ')'))
+    return lambda: f({'x': 3})
+
+
+# objects-OOP-example.py
+
+@case('oop.ledger_transfer', [1000, 3000, 10000, 30000])
+def _(n):
+    ledger = load('objects_oop_example').Ledger()
+    a, b = ledger.open('A', n), ledger.open('B', n)
+
+    def transfers():
+        for _ in range(n):
+            ledger.transfer(a, b, 1)
+            ledger.transfer(b, a, 1)
+    return transfers
+
+
+@case('oop.account_store_batch', [1000, 10000, 100000])
+def _(n):
+    m = load('objects_oop_example')
+    store = m.AccountStore()
+    rows = [store.open(i, m.CheckingAccount) for i in range(n)]
+    amounts = [1] * n
+
+    def batch():
+        store.deposit_batch(rows, amounts)
+        store.withdraw_batch(rows, amounts)
+    return batch
+
+
+# data-processing-parallel-computing.py
+
+@case('parallel.worker_pool_map', [100, 1000, 10000])
+def _(n):
+    WorkerPool = load('data_processing_parallel_computing').WorkerPool
+
+    def pool_map():
+        with WorkerPool(4) as pool:
+            return pool.map(abs, range(n), batch_size=64)
+    return pool_map
+
+
+@case('parallel.batch_queue', [1000, 10000, 100000])
+def _(n):
+    BatchQueue = load('data_processing_parallel_computing').BatchQueue
+
+    def round_trip():
+        q = BatchQueue()
+        q.put_many(range(n))
+        while q.qsize():
+            q.get_many(512)
+    return round_trip
+
+
+@case('parallel.bloom_filter', [1000, 3000, 10000, 30000])
+def _(n):
+    m = load('data_processing_parallel_computing')
+    digests = [m._digest(i) for i in range(n)]
+
+    def add_and_test():
+        bloom = m.BloomFilter(n)
+        for d in digests:
+            bloom.add(d)
+        return sum(d in bloom for d in digests)
+    return add_and_test
+
+
+@case('parallel.sharded_counter', [1000, 10000, 100000])
+def _(n):
+    ShardedCounter = load('data_processing_parallel_computing').ShardedCounter
+
+    def add_many():
+        c = ShardedCounter()
+        for _ in range(n):
+            c.add()
+        return c.value()
+    return add_many
@@ -1,5 +1,9 @@
 """Examples of sequences as conventional interfaces."""
 
+import codecs
+from itertools import accumulate, count, islice
+from operator import add, itemgetter
+
 
 def fib(k):
     """Compute the kth Fibonacci number.
@@ -17,6 +21,18 @@ def fib(k):
     return curr
 
 
+def fibs():
+    """Generate the Fibonacci numbers, fib(1), fib(2), ..., each from the two before it.
+
+    >>> tuple(islice(fibs(), 11))
+    (0, 1, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+    """
+    prev, curr = 1, 0
+    while True:
+        yield curr
+        prev, curr = curr, prev + curr
+
+
 def iseven(n):
     return n % 2 == 0
 
@@ -24,10 +40,12 @@ def iseven(n):
 def sum_even_fibs(n):
     """Sum the first n even Fibonacci numbers.
 
+    map(fib, range(1, n + 1)) would compute each fib(k) from scratch, O(n^2) additions in all;
+    fibs() carries the last two numbers from one element to the next.
     >>> sum_even_fibs(11)
     44
     """
-    return sum(filter(iseven, map(fib, range(1, n + 1))))
+    return sum(filter(iseven, islice(fibs(), n)))
 
 
 def first(s):
@@ -44,7 +62,7 @@ def acronym(name):
     >>> acronym('University of California Berkeley')
     ('U', 'C', 'B')
     """
-    return tuple(map(first, filter(iscap, name.split())))
+    return tuple(map(first, filter(iscap, words(name))))
 
 
 def sum_even_fibs_gen(n):
@@ -53,7 +71,7 @@ def sum_even_fibs_gen(n):
     >>> sum_even_fibs_gen(11)
     44
     """
-    return sum(fib(k) for k in range(1, n + 1) if fib(k) % 2 == 0)
+    return sum(f for f in islice(fibs(), n) if f % 2 == 0)
 
 
 def acronym_gen(name):
@@ -62,4 +80,204 @@ def acronym_gen(name):
     >>> acronym_gen('University of California Berkeley')
     ('U', 'C', 'B')
     """
-    return tuple(w[0] for w in name.split() if iscap(w))
+    return tuple(w[0] for w in words(name) if iscap(w))
+
+
+# text sources, read as streams of chunks rather than split all at once
+def chunks(source, size=1 << 20):
+    """Iterate over the text of source in pieces: a string is one piece, a file is read
+    size characters (or, opened in binary, bytes decoded as UTF-8) at a time, and any other
+    iterable is taken to yield pieces already.
+
+    >>> import io
+    >>> list(chunks(io.BytesIO('Caf\u00e9 au lait'.encode()), size=4))
+    ['Caf', '\xe9 au', ' lai', 't']
+    """
+    if isinstance(source, str):
+        yield source
+    elif hasattr(source, 'read'):
+        decode = codecs.getincrementaldecoder('utf-8')().decode
+        while True:
+            chunk = source.read(size)
+            if not chunk:  # '' or b'' at the end of the file
+                break
+            yield decode(chunk) if isinstance(chunk, bytes) else chunk
+        decode(b'', final=True)  # raises if the file ends inside a character
+    else:
+        yield from source
+
+
+def words(source):
+    """Generate the whitespace-separated words of source (see chunks), as str.split would,
+    splitting one chunk at a time. A word cut by a chunk boundary is joined back together.
+
+    >>> list(words(['Univer', 'sity of ', ' California', ' Berkeley']))
+    ['University', 'of', 'California', 'Berkeley']
+    """
+    partial = ''  # the last word of the chunk before, if the chunk ended inside it
+    for chunk in chunks(source):
+        if not chunk:
+            continue
+        found = chunk.split()
+        if partial:
+            if chunk[0].isspace():
+                yield partial
+            else:
+                found[0] = partial + found[0]
+            partial = ''
+        if found and not chunk[-1].isspace():
+            partial = found.pop()
+        yield from found
+    if partial:
+        yield partial
+
+
+def initials(source):
+    """Generate the first character of each word of source, splitting one chunk at a time.
+
+    >>> ''.join(initials(['Univer', 'sity of ', ' California', ' Berkeley']))
+    'UoCB'
+    """
+    inside = False  # whether the chunk before ended inside a word
+    for chunk in chunks(source):
+        if not chunk:
+            continue
+        letters = map(itemgetter(0), chunk.split())
+        if inside and not chunk[0].isspace():
+            next(letters, None)  # that word's first letter was in an earlier chunk
+        yield from letters
+        inside = not chunk[-1].isspace()
+
+
+def acronym_stream(source):
+    """Iterate over the acronym letters of source, a string, file or iterable of pieces.
+
+    >>> import io
+    >>> ''.join(acronym_stream(io.StringIO('University of California Berkeley')))
+    'UCB'
+    """
+    return filter(str.isupper, initials(source))
+
+
+# pipelines of conventional interfaces
+class Pipeline:
+    """A lazy sequence of enumerate, filter, map and accumulate stages over an iterable.
+
+    Each stage wraps the iterator of the one before it, so elements flow through every stage
+    one at a time, and state (such as the last Fibonacci numbers, or a running total) lives
+    in the stage that needs it. A pipeline is consumed by iterating over it once.
+    >>> Pipeline(fibs()).take(11).filter(iseven).sum()
+    44
+    >>> Pipeline(words('University of California Berkeley')).filter(iscap).map(first).collect()
+    ('U', 'C', 'B')
+    >>> Pipeline.enumerate(1).map(fib).take(6).accumulate().collect()
+    (0, 1, 2, 4, 7, 12)
+    """
+
+    def __init__(self, source):
+        self.source = source
+
+    @staticmethod
+    def enumerate(start=0, stop=None):
+        """A pipeline of the integers from start, up to but not including stop if given."""
+        return Pipeline(count(start) if stop is None else range(start, stop))
+
+    def map(self, fn):
+        return Pipeline(map(fn, self.source))
+
+    def filter(self, fn):
+        return Pipeline(filter(fn, self.source))
+
+    def accumulate(self, fn=add, initial=None):
+        """Running results of fn, as itertools.accumulate."""
+        return Pipeline(accumulate(self.source, fn, initial=initial))
+
+    def take(self, n):
+        return Pipeline(islice(self.source, n))
+
+    def __iter__(self):
+        return iter(self.source)
+
+    def sum(self, start=0):
+        return sum(self.source, start)
+
+    def collect(self):
+        return tuple(self.source)
+
+
+def sum_even_fibs_benchmark(n=10 ** 5, quadratic_n=2000):
+    """Time the versions of sum_even_fibs for n, and map(fib, ...) for a smaller quadratic_n."""
+    from time import perf_counter
+    versions = [
+        ('sum_even_fibs', lambda: sum_even_fibs(n)),
+        ('sum_even_fibs_gen', lambda: sum_even_fibs_gen(n)),
+        ('Pipeline', lambda: Pipeline(fibs()).take(n).filter(iseven).sum()),
+    ]
+    results = []
+    for name, run in versions:
+        start = perf_counter()
+        results.append(run())
+        print('{0:30s} n={1:<8d} {2:8.3f} s'.format(name, n, perf_counter() - start))
+    assert len(set(results)) == 1
+    start = perf_counter()
+    sum(filter(iseven, map(fib, range(1, quadratic_n + 1))))
+    print('{0:30s} n={1:<8d} {2:8.3f} s'.format('map(fib, range(...))', quadratic_n,
+                                                perf_counter() - start))
+
+
+def acronym_benchmark(megabytes=256, path=None, split_limit=512):
+    """Write megabytes of text to a file (or use path) and time reading its acronym letters.
+
+    The streamed versions hold one chunk at a time, so they handle files of many gigabytes;
+    reading the file whole and calling split is only timed up to split_limit megabytes.
+    """
+    import os
+    import random
+    import tempfile
+    import tracemalloc
+    from time import perf_counter
+    remove = path is None
+    if path is None:
+        rng = random.Random(0)
+        vocabulary = ['University', 'of', 'California', 'Berkeley', 'and', 'the', 'Structure',
+                      'Interpretation', 'Computer', 'Programs', 'in', 'a']
+        block = ' '.join(rng.choice(vocabulary) for _ in range(1 << 18)) + '\n'
+        fd, path = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(fd, 'w') as f:
+            for _ in range(max(1, (megabytes << 20) // len(block))):
+                f.write(block)
+    size = os.path.getsize(path) / (1 << 20)
+    try:
+        versions = [
+            ('acronym_stream', lambda f: sum(1 for _ in acronym_stream(f))),
+            ('words + iscap', lambda f: sum(1 for w in words(f) if iscap(w))),
+        ]
+        if size <= split_limit:
+            versions.append(('read + split', lambda f: len(acronym(f.read()))))
+        for name, run in versions:
+            with open(path) as f:
+                start = perf_counter()
+                letters = run(f)
+                elapsed = perf_counter() - start
+            print('{0:20s} {1:8.0f} MB {2:7.2f} s {3:8.1f} MB/s  {4} letters'.format(
+                name, size, elapsed, size / elapsed, letters))
+        with open(path) as f:
+            tracemalloc.start()
+            for _ in islice(acronym_stream(f), 10 ** 6):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        print('acronym_stream peak traced memory: {0:.1f} MB'.format(peak / (1 << 20)))
+    finally:
+        if remove:
+            os.remove(path)
+
+
+def conventional_demo():
+    print(sum_even_fibs(11), sum_even_fibs_gen(11))
+    print(acronym('University of California Berkeley'))
+    print(Pipeline.enumerate(1).map(fib).filter(iseven).take(5).collect())
+
+
+if __name__ == '__main__':
+    conventional_demo()
@@ -0,0 +1,513 @@
+"""Calculator: an interpreter for nested arithmetic call expressions, e.g. (+ 1 (* 2 3))."""
+
+from collections import deque
+from functools import lru_cache, reduce
+from operator import add, sub, mul, truediv
+
+
+# Expression trees
+# A call expression is a Pair whose first element is the operator and whose rest is a Scheme
+# list of operands; nil ends a list. Primitive expressions are numbers and symbols (strings).
+class Pair:
+    """A pair with a first element and a second element (usually the rest of a list).
+    >>> s = Pair(1, Pair(2, nil))
+    >>> s
+    Pair(1, Pair(2, nil))
+    >>> print(s)
+    (1 2)
+    >>> len(s)
+    2
+    """
+    __slots__ = ('first', 'second', '__weakref__')  # weak references for ExpressionCache
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def __repr__(self):
+        return 'Pair({0}, {1})'.format(repr(self.first), repr(self.second))
+
+    def __str__(self):
+        s = '(' + str(self.first)
+        second = self.second
+        while isinstance(second, Pair):
+            s += ' ' + str(second.first)
+            second = second.second
+        if second is not nil:
+            s += ' . ' + str(second)
+        return s + ')'
+
+    def __len__(self):
+        n, second = 1, self.second
+        while isinstance(second, Pair):
+            n += 1
+            second = second.second
+        return n
+
+    def __iter__(self):
+        s = self
+        while s is not nil:
+            yield s.first
+            s = s.second
+
+    def map(self, fn):
+        """Return a Scheme list of fn applied to each element."""
+        return scheme_list(*[fn(x) for x in self])
+
+
+class nil:
+    """The empty list."""
+
+    def __repr__(self):
+        return 'nil'
+
+    def __str__(self):
+        return '()'
+
+    def __len__(self):
+        return 0
+
+    def __iter__(self):
+        return iter(())
+
+    def map(self, fn):
+        return self
+
+
+nil = nil()
+
+
+def scheme_list(*args):
+    """Return a Scheme list of args."""
+    s = nil
+    for x in reversed(args):
+        s = Pair(x, s)
+    return s
+
+
+# Tokenizer and parser
+def tokenize_line(line):
+    """Return the tokens of a line of Calculator code.
+    >>> tokenize_line('(+ 1 (* 2.5 x))')
+    ['(', '+', 1, '(', '*', 2.5, 'x', ')', ')']
+    """
+    return [_number_or_symbol(t) for t in line.replace('(', ' ( ').replace(')', ' ) ').split()]
+
+
+@lru_cache(maxsize=4096)  # the same operators and small numbers recur throughout large inputs
+def _number_or_symbol(token):
+    for number in (int, float):
+        try:
+            return number(token)
+        except ValueError:
+            pass
+    return token
+
+
+def calc_parse(line):
+    """Parse a line of Calculator code into an expression tree.
+    >>> calc_parse('(+ 1 (* 2 3))')
+    Pair('+', Pair(1, Pair(Pair('*', Pair(2, Pair(3, nil))), nil)))
+    """
+    tokens = deque(tokenize_line(line))
+    expression = scheme_read(tokens)
+    if tokens:
+        raise SyntaxError('extra tokens: ' + ' '.join(map(str, tokens)))
+    return expression
+
+
+def scheme_read(tokens):
+    """Remove the tokens of the first expression from the front of a deque of tokens and return it."""
+    if not tokens:
+        raise SyntaxError('unexpected end of input')
+    token = tokens.popleft()
+    if token == '(':
+        return read_tail(tokens)
+    elif token == ')':
+        raise SyntaxError('unexpected )')
+    return token
+
+
+def read_tail(tokens):
+    """Read the rest of a list whose opening parenthesis has been removed."""
+    operands = []
+    while True:
+        if not tokens:
+            raise SyntaxError('unexpected end of input')
+        if tokens[0] == ')':
+            tokens.popleft()
+            return scheme_list(*operands)
+        operands.append(scheme_read(tokens))
+
+
+# Streaming input
+# calc_parse needs a whole line in memory and recurses once per level of nesting. For large inputs,
+# read_chunks reads a file (through mmap when it can) or a socket a chunk at a time, tokenize_chunks
+# carries a token cut in two by a chunk boundary over to the next chunk, and parse_stream keeps the
+# unfinished lists on an explicit stack, yielding each top-level expression as soon as it closes.
+import codecs
+import mmap
+import re
+
+_token = re.compile(r'[()]|[^\s()]+')
+
+
+def read_chunks(source, chunk_size=1 << 20):
+    """Yield chunks of a file name, a binary or text file, or a socket."""
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            yield from read_chunks(f, chunk_size)
+    elif hasattr(source, 'recv'):
+        while True:
+            chunk = source.recv(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        try:
+            mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):  # not a regular file, or empty
+            mapped = None
+        if mapped is None:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        with mapped:
+            for start in range(0, len(mapped), chunk_size):
+                yield mapped[start:start + chunk_size]
+
+
+def tokenize_chunks(chunks):
+    """Yield the tokens of Calculator code arriving in chunks of bytes or str.
+    >>> list(tokenize_chunks([b'(+ 12', b'3 (* 4', b' 5))']))
+    ['(', '+', 123, '(', '*', 4, 5, ')', ')']
+    >>> list(tokenize_chunks([b'(+ 1 2) \\xc3']))
+    Traceback (most recent call last):
+        ...
+    UnicodeDecodeError: 'utf-8' codec can't decode byte 0xc3 in position 0: unexpected end of data
+    """
+    decode = codecs.getincrementaldecoder('utf-8')().decode
+    carry = ''
+    for chunk in chunks:
+        text = carry + (decode(chunk) if isinstance(chunk, bytes) else chunk)
+        carry = ''
+        for match in _token.finditer(text):
+            if match.end() == len(text) and match.group() not in '()':
+                carry = match.group()  # may continue in the next chunk
+            else:
+                yield _number_or_symbol(match.group())
+    carry += decode(b'', final=True)  # raises if the input ends inside a character
+    if carry:
+        yield _number_or_symbol(carry)
+
+
+def parse_stream(tokens):
+    """Yield each top-level expression of a token stream, without recursion.
+    >>> [str(e) for e in parse_stream(tokenize_line('(+ 1 2) 3 (* (- 4) 5)'))]
+    ['(+ 1 2)', '3', '(* (- 4) 5)']
+    >>> deep = next(parse_stream(tokenize_line('(+ ' * 100000 + '1' + ')' * 100000)))
+    >>> len(deep)
+    2
+    """
+    stack = []  # operands read so far for each open parenthesis
+    for token in tokens:
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            if not stack:
+                raise SyntaxError('unexpected )')
+            exp = scheme_list(*stack.pop())
+            if stack:
+                stack[-1].append(exp)
+            else:
+                yield exp
+        elif stack:
+            stack[-1].append(token)
+        else:
+            yield token
+    if stack:
+        raise SyntaxError('unexpected end of input')
+
+
+def calc_read(source, chunk_size=1 << 20):
+    """Yield the expressions of a file name, file or socket of Calculator code."""
+    return parse_stream(tokenize_chunks(read_chunks(source, chunk_size)))
+
+
+def parse_benchmark(megabytes=20):
+    """Print parse throughput and peak traced memory for a generated file of expressions."""
+    import os
+    import tempfile
+    import tracemalloc
+    from random import Random
+    from time import perf_counter
+    rand = Random(0)
+
+    def expression(depth):
+        if depth == 0 or rand.random() < 0.3:
+            return str(rand.randrange(100))
+        operands = ' '.join(expression(depth - 1) for _ in range(rand.randrange(1, 4)))
+        return '(' + rand.choice('+-*') + ' ' + operands + ')'
+
+    with tempfile.NamedTemporaryFile('w', suffix='.calc', delete=False) as f:
+        lines = [expression(6) + '\n' for _ in range(1000)]
+        while f.tell() < megabytes << 20:
+            f.writelines(lines)
+        path, size = f.name, f.tell()
+    try:
+        start = perf_counter()
+        count = sum(1 for _ in calc_read(path))
+        elapsed = perf_counter() - start
+        tracemalloc.start()  # in a second pass, since tracing slows parsing down
+        for _ in calc_read(path):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        os.remove(path)
+    print('{0} expressions, {1:6.2f} MB/s, peak {2:5.1f} MB traced'.format(
+        count, size / elapsed / 1e6, peak / 1e6))
+
+
+# Evaluation
+def calc_eval(exp, env=None):
+    """Evaluate a Calculator expression; symbols other than operators are looked up in env.
+    >>> calc_eval(calc_parse('(+ 2 (* 4 6))'))
+    26
+    >>> calc_eval(calc_parse('(- (/ x 2) 1)'), {'x': 10})
+    4.0
+    """
+    if isinstance(exp, Pair):
+        arguments = exp.second.map(lambda operand: calc_eval(operand, env))
+        return calc_apply(exp.first, arguments)
+    elif isinstance(exp, str):
+        if env is None or exp not in env:
+            raise NameError('unknown name: ' + exp)
+        return env[exp]
+    return exp
+
+
+def calc_apply(operator, args):
+    """Apply the named operator to a Scheme list of arguments.
+    >>> calc_apply('+', scheme_list(1, 2, 3))
+    6
+    >>> calc_apply('-', scheme_list(10, 1, 2, 3))
+    4
+    >>> calc_apply('-', scheme_list(10))
+    -10
+    >>> calc_apply('*', nil)
+    1
+    >>> calc_apply('/', scheme_list(40, 5))
+    8.0
+    """
+    args = list(args)
+    if operator == '+':
+        return sum(args)
+    elif operator == '-':
+        if not args:
+            raise TypeError(operator + ' requires at least 1 argument')
+        return -args[0] if len(args) == 1 else reduce(sub, args)
+    elif operator == '*':
+        return reduce(mul, args, 1)
+    elif operator == '/':
+        if not args:
+            raise TypeError(operator + ' requires at least 1 argument')
+        return 1 / args[0] if len(args) == 1 else reduce(truediv, args)
+    raise TypeError('unknown operator: ' + str(operator))
+
+
+# Compilation
+# calc_eval walks the tree every time an expression is evaluated. calc_compile walks it once and
+# returns a Python function of an environment; the operator dispatch and the tree traversal are
+# done at compile time, leaving only calls of nested closures when the function is evaluated.
+def calc_compile(exp):
+    """Return a function of env that evaluates exp.
+    >>> f = calc_compile(calc_parse('(+ (* x x) (- y) 1)'))
+    >>> f({'x': 3, 'y': 2}), f({'x': 4, 'y': 0})
+    (8, 17)
+    """
+    if isinstance(exp, Pair):
+        operator = exp.first
+        operands = [calc_compile(operand) for operand in exp.second]
+        if operator not in ('+', '-', '*', '/'):
+            raise TypeError('unknown operator: ' + str(operator))
+        if operator in ('-', '/') and not operands:
+            raise TypeError(operator + ' requires at least 1 argument')
+        if len(operands) == 2 and operator in _binary:
+            fn, (left, right) = _binary[operator], operands
+            return lambda env: fn(left(env), right(env))
+        return lambda env: calc_apply(operator, [operand(env) for operand in operands])
+    elif isinstance(exp, str):
+        def lookup(env):
+            if env is None or exp not in env:
+                raise NameError('unknown name: ' + exp)
+            return env[exp]
+        return lookup
+    return lambda env: exp
+
+
+_binary = {'+': add, '-': sub, '*': mul, '/': truediv}
+
+
+def calc_benchmark(n=20000):
+    """Print evaluations per second of one parsed expression, interpreted and compiled."""
+    from time import perf_counter
+    exp = calc_parse('(+ (* x x) (* 2 x y) (- (/ y 2) 3) (* (+ x 1) (- y 1)))')
+    envs = [{'x': i, 'y': i + 1} for i in range(n)]
+    start = perf_counter()
+    interpreted = [calc_eval(exp, env) for env in envs]
+    elapsed = perf_counter() - start
+    print('calc_eval:    {0:9.0f} evaluations/s'.format(n / elapsed))
+    start = perf_counter()
+    f = calc_compile(exp)
+    assert [f(env) for env in envs] == interpreted
+    elapsed = perf_counter() - start
+    print('calc_compile: {0:9.0f} evaluations/s'.format(n / elapsed))
+
+
+# Sharing and caching
+# Large workloads repeat themselves: the same subexpression appears in many expressions, and parts
+# of expressions contain no names at all. ExpressionCache.intern rebuilds an expression so that
+# equal subexpressions are one shared Pair ("hash-consing"), and replaces subexpressions without
+# names by their values ("constant folding"). ExpressionCache.eval then remembers the value of each
+# shared subexpression for the values of the names it uses, keeping the maxsize most recent ones.
+# The table of shared subexpressions also keeps only the maxsize most recent ones; what the cache
+# knows about a shared Pair (a serial number and its names) is held weakly, so it goes away with
+# the last expression using that Pair, and memory stays bounded however many expressions stream by.
+from collections import OrderedDict
+from itertools import count
+from weakref import WeakKeyDictionary
+
+
+class ExpressionCache:
+    """Interns, folds and memoizes Calculator expressions.
+    >>> cache = ExpressionCache()
+    >>> a = cache.intern(calc_parse('(+ (* x 2) (* 3 4))'))
+    >>> b = cache.intern(calc_parse('(- (* x 2))'))
+    >>> print(a), a.second.first is b.second.first
+    (+ (* x 2) 12)
+    (None, True)
+    >>> cache.eval(a, {'x': 5}), cache.eval(b, {'x': 5}), cache.eval(b, {'x': 1})
+    (22, -10, -2)
+    >>> cache.stats()
+    {'hits': 1, 'misses': 5, 'hit_rate': 0.16666666666666666, 'cached': 5, 'interned': 3}
+    >>> cache.eval(calc_parse('(* x 3)'), {'x': 2})  # not interned yet, so interned now
+    6
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.interned = OrderedDict()  # (operator, operand keys) -> shared Pair, least recent first
+        self.info = WeakKeyDictionary()  # shared Pair -> (serial number, names it uses, sorted)
+        self.results = OrderedDict()  # (serial, values of its names) -> value, least recent first
+        self.hits = self.misses = 0
+        self._serials = count()
+
+    def intern(self, exp):
+        """Return exp with constant subexpressions folded and equal subexpressions shared."""
+        if not isinstance(exp, Pair):
+            return exp
+        operands = [self.intern(operand) for operand in exp.second]
+        if not any(isinstance(operand, (Pair, str)) for operand in operands):
+            try:
+                return calc_apply(exp.first, operands)
+            except (TypeError, ZeroDivisionError):
+                pass  # leave it for eval to raise the error
+        key = (exp.first, tuple(self._key(operand) for operand in operands))
+        shared = self.interned.get(key)
+        if shared is None:
+            shared = Pair(exp.first, scheme_list(*operands))
+            names = set()
+            for operand in operands:
+                if isinstance(operand, str):
+                    names.add(operand)
+                elif isinstance(operand, Pair):
+                    names.update(self.info[operand][1])
+            self.info[shared] = (next(self._serials), tuple(sorted(names)))
+            self.interned[key] = shared
+            if len(self.interned) > self.maxsize:
+                self.interned.popitem(last=False)
+        else:
+            self.interned.move_to_end(key)
+        return shared
+
+    def _key(self, operand):
+        if isinstance(operand, Pair):
+            return self.info[operand][0]  # serial numbers, unlike ids, are never reused
+        return type(operand), operand  # so that 1 and 1.0 stay apart
+
+    def eval(self, exp, env=None):
+        """Evaluate an expression, reusing remembered subexpression values.
+
+        An expression this cache did not return from intern is interned first; interning once,
+        when parsing, saves doing so on every evaluation.
+        """
+        if not isinstance(exp, Pair):
+            return calc_eval(exp, env)
+        info = self.info.get(exp)
+        if info is None:
+            exp = self.intern(exp)
+            if not isinstance(exp, Pair):
+                return exp  # folded to a constant
+            info = self.info[exp]
+        serial, names = info
+        if names and env is None:
+            raise NameError('unknown name: ' + names[0])
+        try:
+            key = (serial,) + tuple((type(env[name]), env[name]) for name in names)
+        except KeyError as e:
+            raise NameError('unknown name: ' + e.args[0])
+        if key in self.results:
+            self.hits += 1
+            self.results.move_to_end(key)
+            return self.results[key]
+        self.misses += 1
+        value = calc_apply(exp.first, [self.eval(operand, env) for operand in exp.second])
+        self.results[key] = value
+        if len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'cached': len(self.results), 'interned': len(self.interned)}
+
+
+def cache_benchmark(n=20000, distinct=50, seed=0):
+    """Print the time to evaluate n expressions, about half of them repeats, whose operands come
+    from a pool of distinct subexpressions, with calc_eval and with an ExpressionCache."""
+    from random import Random
+    from time import perf_counter
+    rand = Random(seed)
+    pool = ['(* x {0})'.format(i) if i % 2 else '(+ y (* {0} 3))'.format(i) for i in range(distinct)]
+    lines = ['(+ {0} {1} (* 2 5))'.format(rand.choice(pool), rand.choice(pool)) for _ in range(n // 2)]
+    lines += rand.sample(lines, n - len(lines))
+    expressions = [calc_parse(line) for line in lines]
+    envs = [{'x': rand.randrange(4), 'y': rand.randrange(4)} for _ in range(n)]
+
+    start = perf_counter()
+    expected = [calc_eval(exp, env) for exp, env in zip(expressions, envs)]
+    print('calc_eval:       {0:7.1f} ms'.format((perf_counter() - start) * 1000))
+
+    cache = ExpressionCache()
+    interned = [cache.intern(exp) for exp in expressions]  # once, when parsing
+    start = perf_counter()
+    assert [cache.eval(exp, env) for exp, env in zip(interned, envs)] == expected
+    print('ExpressionCache: {0:7.1f} ms, {1}'.format((perf_counter() - start) * 1000, cache.stats()))
+
+
+def read_eval_print_loop():
+    """Run a read-eval-print loop for Calculator."""
+    while True:
+        try:
+            expression = calc_parse(input('calc> '))
+            print(calc_eval(expression))
+        except (SyntaxError, TypeError, NameError, ZeroDivisionError) as err:
+            print(type(err).__name__ + ':', err)
+        except (KeyboardInterrupt, EOFError):  # <Control>-D, etc.
+            print('Calculation completed.')
+            return
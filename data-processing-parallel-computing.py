@@ -3,7 +3,7 @@
 # due to GIL, the interpreter only interprets code in one thread at a time, while I/O may run in parallel
 import threading
 import multiprocessing
-from time import sleep
+from time import monotonic, sleep
 
 
 def thread_hello():
@@ -40,10 +40,14 @@ def increment():
     counter[0] = count + 1
 
 
-other = threading.Thread(target=increment, args=())
-other.start()
-increment()  # counter[0] is accessed concurrently
-print('count is now: ', counter[0])
+def race_condition():
+    """Running increment in 2 threads at once."""
+    other = threading.Thread(target=increment, args=())
+    other.start()
+    increment()  # counter[0] is accessed concurrently
+    other.join()
+    print('count is now: ', counter[0])
+
 
 # using synchronized data structure (queue)
 
@@ -80,8 +84,6 @@ def synchronized_produce():
     queue.join()
 
 
-synchronized_produce()
-
 # locks
 seen = set()
 seen_lock = threading.Lock()
@@ -115,8 +117,6 @@ def threaded_count(steps):
     print('counters:', counters)
 
 
-threaded_count(10)
-
 
 # message passing through Pipe between processes
 def process_consume(in_pipe):
@@ -136,8 +136,6 @@ def process_produce():
     pipe[1].send(None)  # done signal
 
 
-process_produce()
-
 
 # deadlock on processes
 def deadlock(in_pipe, out_pipe):
@@ -157,4 +155,1289 @@ def create_deadlock():
     deadlock(pipe[1], pipe[0])
 
 
-create_deadlock()
+# worker pools
+# the examples above start a new Thread or Process for every task; starting a process takes tens
+# of milliseconds. A pool starts its workers once and hands them tasks. In the thread pool each
+# worker has its own deque: it takes its newest task from the right end, and when its deque is
+# empty it steals the oldest task from the left end of another worker's deque. Tasks can be
+# submitted in batches, so that the per-task overhead is paid once for many calls.
+# The workers are daemons, and a pool not shut down explicitly is shut down at exit. Process
+# tasks are pickled when submitted, so an error reaches the caller, and if a process worker dies
+# the pool is broken: every outstanding Future fails with BrokenPool, as do later submissions.
+import atexit
+import pickle
+from collections import deque
+from itertools import count as counter_from
+from queue import Empty
+
+
+class BrokenPool(RuntimeError):
+    """A process worker died, so the tasks it may have been running will never finish."""
+
+
+class WorkerPool:
+    """Persistent thread or process workers returning a Future for each call.
+
+    Call shutdown (or use the pool in a with statement) to let the workers finish; submitting
+    after that raises RuntimeError.
+    >>> with WorkerPool(2) as pool:
+    ...     f = pool.submit(pow, 2, 10)
+    ...     squares = pool.map(lambda x: x * x, range(5), batch_size=2)
+    >>> f.result(), squares
+    (1024, [0, 1, 4, 9, 16])
+    >>> with WorkerPool(1, processes=True) as pool:
+    ...     try:
+    ...         pool.submit(lambda x: x, 1)
+    ...     except Exception:  # a PicklingError or AttributeError, raised by submit
+    ...         print('not picklable')
+    not picklable
+    >>> pool.submit(pow, 2, 3)
+    Traceback (most recent call last):
+        ...
+    RuntimeError: cannot schedule new tasks after shutdown
+    """
+
+    def __init__(self, workers=4, processes=False):
+        from concurrent.futures import Future  # slow to import, so not at the top of the file
+        self._Future = Future
+        self.processes = processes
+        self._closing = False
+        if processes:
+            self._tasks = multiprocessing.Queue()
+            self._results = multiprocessing.Queue()
+            self._futures = {}
+            self._task_ids = counter_from()
+            self._lock = threading.Lock()  # guards _futures and _broken
+            self._broken = None
+            self._workers = [multiprocessing.Process(target=_process_worker,
+                                                     args=(self._tasks, self._results), daemon=True)
+                             for _ in range(workers)]
+            self._collector = threading.Thread(target=self._collect, daemon=True)
+            self._collector.start()
+        else:
+            self._deques = [deque() for _ in range(workers)]
+            self._next = 0
+            self._queued = 0  # tasks in any deque and not yet claimed, guarded by _work
+            self._work = threading.Condition()
+            self._workers = [threading.Thread(target=self._thread_worker, args=(i,), daemon=True)
+                             for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, fn, *args):
+        """Schedule fn(*args) and return its Future."""
+        return self.submit_batch(fn, [args])[0]
+
+    def submit_batch(self, fn, arg_lists):
+        """Schedule fn(*args) for each args in arg_lists as one task; return their Futures."""
+        arg_lists = list(arg_lists)
+        futures = [self._Future() for _ in arg_lists]
+        if self.processes:
+            task_id = next(self._task_ids)
+            task = pickle.dumps((task_id, fn, arg_lists))  # raises here, not in the queue's thread
+            with self._lock:
+                if self._broken:
+                    raise BrokenPool(self._broken)
+                if self._closing:
+                    raise RuntimeError('cannot schedule new tasks after shutdown')
+                self._futures[task_id] = futures
+                self._tasks.put(task)  # before shutdown's stop signals, which take the lock
+        else:
+            with self._work:
+                if self._closing:
+                    raise RuntimeError('cannot schedule new tasks after shutdown')
+                self._deques[self._next % len(self._deques)].append((fn, arg_lists, futures))
+                self._next += 1
+                self._queued += 1
+                self._work.notify()
+        return futures
+
+    def map(self, fn, iterable, batch_size=1):
+        """Return [fn(x) for x in iterable], computed by the workers batch_size calls per task."""
+        args = [(x,) for x in iterable]
+        futures = []
+        for i in range(0, len(args), batch_size):
+            futures.extend(self.submit_batch(fn, args[i:i + batch_size]))
+        return [f.result() for f in futures]
+
+    def shutdown(self):
+        """Finish the queued tasks, then stop and join the workers."""
+        atexit.unregister(self.shutdown)
+        if self._closing:
+            return
+        if self.processes:
+            with self._lock:
+                self._closing = True
+                for _ in self._workers:
+                    self._tasks.put(None)
+            for worker in self._workers:
+                worker.join()
+            self._results.put(None)
+            self._collector.join()
+        else:
+            with self._work:
+                self._closing = True
+                self._work.notify_all()
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def _thread_worker(self, i):
+        own = self._deques[i]
+        others = self._deques[i + 1:] + self._deques[:i]
+        while True:
+            with self._work:
+                while not self._queued and not self._closing:
+                    self._work.wait()
+                if not self._queued:
+                    return  # closing, and every task has been claimed
+                self._queued -= 1  # claims one task, which is already in some deque
+            while True:
+                try:
+                    task = own.pop()
+                    break
+                except IndexError:
+                    pass
+                for other in others:  # steal
+                    try:
+                        task = other.popleft()
+                        break
+                    except IndexError:
+                        pass
+                else:
+                    continue
+                break
+            _run_batch(*task)
+
+    def _collect(self):
+        """Resolve the Futures of the process workers' results (runs in a thread)."""
+        while True:
+            try:
+                item = self._results.get(timeout=0.1)
+            except Empty:
+                dead = [w for w in self._workers if w.exitcode is not None]
+                if dead and not self._closing:
+                    self._fail('a worker process exited with code {0}'.format(dead[0].exitcode))
+                continue
+            if item is None:
+                return
+            task_id, outcomes = pickle.loads(item)
+            with self._lock:
+                futures = self._futures.pop(task_id, ())
+            for future, (ok, value) in zip(futures, outcomes):
+                if not future.set_running_or_notify_cancel():
+                    continue  # cancelled by the caller while the task was queued
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _fail(self, reason):
+        """Mark the pool broken and fail every outstanding Future."""
+        with self._lock:
+            self._broken = reason
+            outstanding, self._futures = self._futures, {}
+        for futures in outstanding.values():
+            for future in futures:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(BrokenPool(reason))
+
+
+def _run_batch(fn, arg_lists, futures):
+    for args, future in zip(arg_lists, futures):
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+def _process_worker(tasks, results):
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, fn, arg_lists = pickle.loads(task)
+        outcomes = []
+        for args in arg_lists:
+            try:
+                outcomes.append((True, fn(*args)))
+            except Exception as e:
+                outcomes.append((False, e))
+        results.put(_dumps_outcomes(task_id, outcomes))
+
+
+def _dumps_outcomes(task_id, outcomes):
+    """Pickle a task's outcomes, replacing any that cannot be pickled by the error doing so."""
+    try:
+        return pickle.dumps((task_id, outcomes))
+    except Exception:
+        checked = []
+        for outcome in outcomes:
+            try:
+                pickle.dumps(outcome)
+                checked.append(outcome)
+            except Exception as e:
+                checked.append((False, pickle.PicklingError(repr(e))))
+        return pickle.dumps((task_id, checked))
+
+
+def _tiny_task(x):
+    return x
+
+
+def _medium_task(x):
+    return sum(range(20000)) + x
+
+
+def pool_benchmark(n=200, workers=4):
+    """Print tasks per second for spawn-per-task and for a pool, on tiny and medium tasks."""
+    from time import perf_counter
+    for processes, spawn in ((False, threading.Thread), (True, multiprocessing.Process)):
+        backend = 'process' if processes else 'thread'
+        for task in (_tiny_task, _medium_task):
+            start = perf_counter()
+            for i in range(n):
+                worker = spawn(target=task, args=(i,))
+                worker.start()
+                worker.join()
+            spawned = n / (perf_counter() - start)
+            rates = []
+            for batch_size in (1, 32):
+                with WorkerPool(workers, processes) as pool:
+                    start = perf_counter()
+                    pool.map(task, range(n), batch_size)
+                    rates.append(n / (perf_counter() - start))
+            print('{0:7s} {1:12s} spawn {2:9.0f}/s  pool {3:9.0f}/s  pool batched {4:9.0f}/s'.format(
+                backend, task.__name__, spawned, *rates))
+
+
+# batched queues
+# synchronized_consume takes the Queue's lock twice per item (get and task_done). A BatchQueue
+# moves many items per lock acquisition, and can be closed: once closed and empty, consumers stop
+# instead of blocking forever, so neither daemon threads nor queue.join() are needed.
+class Closed(Exception):
+    """Raised by put_many on a closed BatchQueue."""
+
+
+class BatchQueue(Queue):
+    """A Queue that also puts and gets lists of items, and can be closed.
+    >>> q = BatchQueue(maxsize=4)
+    >>> q.put_many(range(3))
+    >>> q.get_many(2)
+    [0, 1]
+    >>> q.close()
+    >>> list(q.batches(10))
+    [[2]]
+    """
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self.closed = False
+
+    def put_many(self, items):
+        """Put all items, blocking while the queue is full (backpressure)."""
+        items = list(items)
+        with self.not_full:
+            while items:
+                if self.closed:
+                    raise Closed
+                room = len(items) if self.maxsize <= 0 else self.maxsize - self._qsize()
+                if room <= 0:
+                    self.not_full.wait()
+                    continue
+                self.queue.extend(items[:room])
+                self.unfinished_tasks += len(items[:room])
+                items = items[room:]
+                self.not_empty.notify_all()
+
+    def get_many(self, n, linger=0.0, timeout=None):
+        """Remove and return up to n items.
+
+        Blocks until an item arrives (or timeout seconds pass, or the queue is closed), then
+        waits up to linger seconds more for the batch to fill. Returns [] only on timeout or
+        once the queue is closed and empty.
+        """
+        with self.not_empty:
+            if not self.not_empty.wait_for(lambda: self._qsize() or self.closed, timeout):
+                return []
+            if linger and self._qsize() < n and not self.closed:
+                self.not_empty.wait_for(lambda: self._qsize() >= n or self.closed, linger)
+            batch = [self.queue.popleft() for _ in range(min(n, self._qsize()))]
+            self.not_full.notify_all()
+            return batch
+
+    def batches(self, n, linger=0.0):
+        """Yield batches of up to n items until the queue is closed and empty."""
+        while True:
+            batch = self.get_many(n, linger)
+            if not batch:
+                return
+            yield batch
+
+    def task_done_many(self, k):
+        """Call task_done k times, taking the lock once."""
+        with self.all_tasks_done:
+            self.unfinished_tasks -= k
+            if self.unfinished_tasks <= 0:
+                self.all_tasks_done.notify_all()
+
+    def close(self):
+        """Refuse further puts and wake every waiting thread."""
+        with self.mutex:
+            self.closed = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+
+def queue_pipeline(source, stages, batch_size=64, capacity=1024, linger=0.001):
+    """Yield the items of source after passing them through stages, in batches.
+
+    Each stage is a pair (fn, consumers): consumers threads each apply fn to a list of items
+    and put the list fn returns on the next stage's queue. Every queue holds at most capacity
+    items. With more than one consumer per stage, output order is not preserved. An exception
+    in source or in a stage stops the pipeline and is raised here.
+    >>> stages = [(lambda xs: [x * x for x in xs], 2), (lambda xs: [x for x in xs if x % 2], 1)]
+    >>> sorted(queue_pipeline(range(10), stages, batch_size=3))
+    [1, 9, 25, 49, 81]
+    >>> def broken_source():
+    ...     yield 1
+    ...     raise ValueError('source failed')
+    >>> list(queue_pipeline(broken_source(), stages))
+    Traceback (most recent call last):
+        ...
+    ValueError: source failed
+    """
+    queues = [BatchQueue(capacity) for _ in range(len(stages) + 1)]
+    errors = []
+    lock = threading.Lock()
+
+    def produce():
+        try:
+            batch = []
+            for item in source:
+                batch.append(item)
+                if len(batch) == batch_size:
+                    queues[0].put_many(batch)
+                    batch = []
+            queues[0].put_many(batch)
+            queues[0].close()
+        except Closed:
+            pass
+        except Exception as e:  # source raised
+            errors.append(e)
+            for q in queues:
+                q.close()
+
+    def consume(fn, inq, outq, remaining):
+        try:
+            for batch in inq.batches(batch_size, linger):
+                outq.put_many(fn(batch))
+        except Closed:
+            return
+        except Exception as e:
+            errors.append(e)
+            for q in queues:
+                q.close()
+            return
+        with lock:
+            remaining[0] -= 1
+            if not remaining[0]:  # the stage's last consumer closes the next queue
+                outq.close()
+
+    threads = [threading.Thread(target=produce)]
+    for (fn, consumers), inq, outq in zip(stages, queues, queues[1:]):
+        remaining = [consumers]
+        threads += [threading.Thread(target=consume, args=(fn, inq, outq, remaining))
+                    for _ in range(consumers)]
+    for t in threads:
+        t.start()
+    try:
+        for batch in queues[-1].batches(batch_size, linger):
+            yield from batch
+    finally:
+        for q in queues:  # if the caller stops early, unblock every thread
+            q.close()
+        for t in threads:
+            t.join()
+    if errors:
+        raise errors[0]
+
+
+def queue_benchmark(n=100000, batch_sizes=(1, 8, 64, 512)):
+    """Print items/s and p50/p99 latency through a two-stage pipeline, by batch size,
+    next to the one-item-per-get Queue consumer."""
+    from time import perf_counter
+    q, done = Queue(), []
+
+    def one_at_a_time():
+        while True:
+            item = q.get()
+            q.task_done()
+            if item is None:
+                return
+            done.append(perf_counter() - item)
+
+    consumer = threading.Thread(target=one_at_a_time)
+    start = perf_counter()
+    consumer.start()
+    for _ in range(n):
+        q.put(perf_counter())
+    q.put(None)
+    consumer.join()
+    _report('Queue.get', n / (perf_counter() - start), done)
+
+    stages = [(lambda xs: xs, 2), (lambda xs: xs, 2)]
+    for batch_size in batch_sizes:
+        start = perf_counter()
+        stamps = (perf_counter() for _ in range(n))
+        latencies = [perf_counter() - t for t in queue_pipeline(stamps, stages, batch_size)]
+        _report('batch {0}'.format(batch_size), n / (perf_counter() - start), latencies)
+
+
+def _report(name, rate, latencies):
+    latencies.sort()
+    print('{0:10s} {1:10.0f} items/s  p50 {2:8.3f} ms  p99 {3:8.3f} ms'.format(
+        name, rate, latencies[len(latencies) // 2] * 1000, latencies[len(latencies) * 99 // 100] * 1000))
+
+
+# message passing through shared memory
+# Pipe.send pickles every item and makes a system call to copy it into the pipe. A SharedRing is a
+# block of shared memory cut into fixed-size slots used in a circle: the producer copies a message
+# into the next free slot, the consumer reads it in place. Two semaphores count the free and the
+# filled slots; they block the faster side and make the slot's bytes visible to the other process.
+# Bytes-like messages are copied as they are; other objects are pickled, and None still marks
+# the end of the stream. One producer and one consumer only.
+import struct
+
+
+class SharedRing:
+    """A single-producer, single-consumer message channel over shared memory.
+    >>> ring = SharedRing(slots=8, slot_size=4)
+    >>> ring.send(b'abc'); ring.send([1, 2])
+    >>> ring.recv(), ring.recv()
+    (b'abc', [1, 2])
+    >>> ring.send(b'longer than a slot'); ring.send(None)
+    >>> bytes(ring.recv_view()), ring.recv()
+    (b'longer than a slot', None)
+    >>> ring.close(); ring.unlink()
+    """
+    header = struct.Struct('<IBBxx')  # payload length, kind, whether more slots follow
+    RAW, PICKLED, END = 0, 1, 2
+
+    def __init__(self, slots=16, slot_size=1 << 16):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.stride = self.header.size + slot_size
+        from multiprocessing import shared_memory
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * self.stride)
+        self.free = multiprocessing.Semaphore(slots)
+        self.filled = multiprocessing.Semaphore(0)
+        self.write_index = 0  # used by the producer only
+        self.read_index = 0  # used by the consumer only
+        self._view = None  # slot handed out by recv_view, freed by the next recv
+
+    def send(self, item):
+        if item is None:
+            self._put(self.END, b'')
+        elif isinstance(item, (bytes, bytearray, memoryview)):
+            self._put(self.RAW, item)
+        else:
+            self._put(self.PICKLED, pickle.dumps(item, pickle.HIGHEST_PROTOCOL))
+
+    def recv(self):
+        """Return the next item, copied out of shared memory."""
+        kind, data = self._get()
+        item = bytes(data) if kind == self.RAW else self._decode(kind, data)
+        self._release()
+        return item
+
+    def recv_view(self):
+        """Return the next item; bytes come as a memoryview of the slot, without a copy.
+
+        The view is valid until the next recv or recv_view. numpy.frombuffer(view, dtype)
+        reads it as an array, also without a copy.
+        """
+        kind, data = self._get()
+        item = self._decode(kind, data)
+        if kind != self.RAW:
+            self._release()
+        return item
+
+    def close(self):
+        self._release()
+        self.shm.close()
+
+    def unlink(self):
+        """Free the shared memory; call once, from the process that created the ring."""
+        self.shm.unlink()
+
+    def _put(self, kind, data):
+        data = memoryview(data).cast('B')
+        buf, start = self.shm.buf, 0
+        while True:
+            chunk = data[start:start + self.slot_size]
+            start += len(chunk)
+            more = start < len(data)
+            self.free.acquire()
+            offset = (self.write_index % self.slots) * self.stride
+            self.header.pack_into(buf, offset, len(chunk), kind, more)
+            offset += self.header.size
+            buf[offset:offset + len(chunk)] = chunk
+            self.write_index += 1
+            self.filled.release()
+            if not more:
+                return
+
+    def _get(self):
+        """Return (kind, data) of the next message, where data is a view of its slot if it
+        fits in one slot, or the joined bytes otherwise."""
+        self._release()
+        parts = []
+        while True:
+            self.filled.acquire()
+            offset = (self.read_index % self.slots) * self.stride
+            length, kind, more = self.header.unpack_from(self.shm.buf, offset)
+            offset += self.header.size
+            self.read_index += 1
+            self._view = self.shm.buf[offset:offset + length]
+            if not more and not parts:
+                return kind, self._view
+            parts.append(bytes(self._view))
+            self._release()
+            if not more:
+                return kind, b''.join(parts)
+
+    def _release(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+            self.free.release()
+
+    def _decode(self, kind, data):
+        if kind == self.END:
+            return None
+        elif kind == self.PICKLED:
+            return pickle.loads(data)
+        return data
+
+
+def ring_consume(ring):
+    while True:
+        item = ring.recv()
+        if item is None:
+            return
+        print('got an item:', item)
+
+
+def ring_produce():
+    """process_produce, sending through a SharedRing instead of a Pipe."""
+    ring = SharedRing()
+    consumer = multiprocessing.Process(target=ring_consume, args=(ring,))
+    consumer.start()
+    for i in range(10):
+        ring.send(i)
+    ring.send(None)  # done signal
+    consumer.join()
+    ring.close()
+    ring.unlink()
+
+
+def _pipe_drain(in_pipe):
+    while in_pipe.recv_bytes():
+        pass
+
+
+def _ring_drain(ring):
+    while ring.recv_view() is not None:
+        pass
+    ring.close()
+
+
+def transport_benchmark(sizes=(8, 1024, 1 << 16, 1 << 20), volume=1 << 26):
+    """Print messages/s and MB/s through a Pipe and a SharedRing for each payload size."""
+    from time import perf_counter
+    for size in sizes:
+        n = min(20000, volume // size)
+        payload = b'x' * size
+        pipe = multiprocessing.Pipe(False)
+        ring = SharedRing(slots=16, slot_size=max(size, 64))
+        for name, drain, channel, send, end in (
+                ('Pipe', _pipe_drain, pipe[0], pipe[1].send_bytes, b''),
+                ('SharedRing', _ring_drain, ring, ring.send, None)):
+            consumer = multiprocessing.Process(target=drain, args=(channel,))
+            consumer.start()
+            start = perf_counter()
+            for _ in range(n):
+                send(payload)
+            send(end)
+            consumer.join()
+            elapsed = perf_counter() - start
+            print('{0:8d} B {1:10s} {2:9.0f} msg/s {3:9.1f} MB/s'.format(
+                size, name, n / elapsed, n * size / elapsed / 1e6))
+        ring.close()
+        ring.unlink()
+
+
+# deadlock detection
+# create_deadlock hangs because each process waits in recv for the other. A WaitGraph, kept in
+# shared memory, records which participant is blocked receiving from which, and how many messages
+# sent to each participant are not yet received. Participant i is stuck if it waits for j and
+# nothing from j is pending; a cycle of stuck participants can never make progress. A Channel
+# checks for such a cycle while it waits, and raises DeadlockError in every process on the cycle.
+# A recv whose message arrives within one polling interval never touches the graph, and pays only
+# for updating the pending count.
+class DeadlockError(RuntimeError):
+    """Raised in each process of a cycle of processes waiting to receive from each other."""
+
+
+class WaitGraph:
+    """Who waits for whom, among size participants numbered from 0."""
+
+    def __init__(self, size):
+        self.size = size
+        # waiting[i]: the participant i is receiving from, or -1; found[i]: whether i was found
+        # on a cycle; pending[i][j]: messages from j to i not yet received, stored row by row
+        self.state = multiprocessing.Array('i', [-1] * size + [0] * size + [0] * size * size)
+
+    def pipe(self, a, b):
+        """Return a pair of Channels connecting participants a and b."""
+        end_a, end_b = multiprocessing.Pipe()
+        return Channel(self, a, b, end_a), Channel(self, b, a, end_b)
+
+    def pending(self, i, j):
+        """Index in state of the count of messages from j to i not yet received."""
+        return 2 * self.size + i * self.size + j
+
+    def check(self, start):
+        """Return the stuck participants on a cycle through start, or None.
+
+        Every participant on a cycle is marked, so that each one raises, even after
+        the first one to notice has stopped waiting.
+        """
+        state = self.state
+        with state.get_lock():
+            if state[self.size + start]:
+                state[self.size + start] = 0
+                return [start]
+            path, i = [start], start
+            while True:
+                j = state[i]
+                if j < 0 or state[self.pending(i, j)] > 0:
+                    return None  # i is not waiting, or has a message to receive
+                if j == start:
+                    for k in path[1:]:
+                        state[self.size + k] = 1
+                    return path
+                if j in path:
+                    return None
+                path.append(j)
+                i = j
+
+    def reset(self, participant):
+        """Forget that participant is waiting, e.g. after its process was restarted."""
+        with self.state.get_lock():
+            self.state[participant] = -1
+            self.state[self.size + participant] = 0
+
+
+class Channel:
+    """One end of a Pipe between two WaitGraph participants.
+    >>> graph = WaitGraph(2)
+    >>> a, b = graph.pipe(0, 1)
+    >>> a.send('hi'); b.recv()
+    'hi'
+    >>> a.recv(timeout=0.1)
+    Traceback (most recent call last):
+        ...
+    TimeoutError: 0 waited 0.1 s for 1
+    """
+
+    def __init__(self, graph, owner, peer, conn):
+        self.graph, self.owner, self.peer, self.conn = graph, owner, peer, conn
+
+    def send(self, item):
+        state = self.graph.state
+        with state.get_lock():
+            state[self.graph.pending(self.peer, self.owner)] += 1
+        self.conn.send(item)
+
+    def recv(self, timeout=None, interval=0.05):
+        """Receive an item, raising TimeoutError after timeout seconds, or DeadlockError
+        as soon as this process is found on a cycle of waiting processes."""
+        deadline = None if timeout is None else monotonic() + timeout
+        # most waits are short; only a wait that outlasts interval is recorded in the graph
+        if not self.conn.poll(interval if timeout is None else min(interval, timeout)):
+            self._wait(deadline, timeout, interval)
+        item = self.conn.recv()
+        state = self.graph.state
+        with state.get_lock():
+            state[self.graph.pending(self.owner, self.peer)] -= 1
+        return item
+
+    def _wait(self, deadline, timeout, interval):
+        self.graph.state[self.owner] = self.peer
+        try:
+            while not self.conn.poll(interval if deadline is None
+                                     else max(0, min(interval, deadline - monotonic()))):
+                cycle = self.graph.check(self.owner)
+                if cycle:
+                    raise DeadlockError('participant {0} is deadlocked'.format(self.owner))
+                if deadline is not None and monotonic() >= deadline:
+                    raise TimeoutError('{0} waited {1} s for {2}'.format(self.owner, timeout, self.peer))
+        finally:
+            self.graph.state[self.owner] = -1
+
+
+def detected_deadlock(in_channel, out_channel):
+    """deadlock, over Channels."""
+    try:
+        item = in_channel.recv()
+    except DeadlockError as e:
+        print(multiprocessing.current_process().name, e)
+        return
+    out_channel.send(item + 1)
+
+
+def create_detected_deadlock():
+    """create_deadlock, except that both processes find the deadlock and return."""
+    graph = WaitGraph(2)
+    main_end, other_end = graph.pipe(0, 1)
+    other = multiprocessing.Process(target=detected_deadlock, args=(other_end, other_end))
+    other.start()
+    detected_deadlock(main_end, main_end)
+    other.join()
+
+
+def supervise(target, args=(), timeout=None, restarts=3, graph=None, participant=None):
+    """Run target(*args) in a process, restarting it when it fails or runs longer than timeout.
+
+    Return the exit code of the last run. If the process is a participant in graph,
+    its wait is cleared before each restart.
+    """
+    for _ in range(restarts + 1):
+        worker = multiprocessing.Process(target=target, args=args)
+        worker.start()
+        worker.join(timeout)
+        if worker.is_alive():  # stuck
+            worker.terminate()
+            worker.join()
+        elif worker.exitcode == 0:
+            return 0
+        if graph is not None:
+            graph.reset(participant)
+    return worker.exitcode
+
+
+def _echo(conn, n):
+    for _ in range(n):
+        conn.send(conn.recv())
+
+
+def channel_benchmark(n=20000):
+    """Print round trips per second between two processes over a Pipe and over Channels."""
+    from time import perf_counter
+    graph = WaitGraph(2)
+    for name, (near, far) in (('Pipe', multiprocessing.Pipe()), ('Channel', graph.pipe(0, 1))):
+        other = multiprocessing.Process(target=_echo, args=(far, n))
+        other.start()
+        start = perf_counter()
+        for i in range(n):
+            near.send(i)
+            near.recv()
+        elapsed = perf_counter() - start
+        other.join()
+        print('{0:8s} {1:9.0f} round trips/s'.format(name, n / elapsed))
+
+
+# scalable deduplication
+# already_seen makes every thread wait for the one seen_lock, and seen grows without bound.
+# ShardedSeen splits the items into shards by hash, each with its own lock, so threads checking
+# different items rarely wait for each other. Given a capacity, each shard is a Bloom filter
+# instead of a set: a fixed array of bits, k of which are set for each item. Its memory does not
+# grow with the number of items, at the cost of answering "seen" for a small fraction
+# (error_rate) of new items. With a ttl, items not seen for ttl seconds are forgotten.
+from hashlib import blake2b
+from math import ceil, log
+
+
+def _mix(x):
+    """splitmix64: spread the bits of x, so that hash(n) == n still gives random positions."""
+    x = (x + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+def _digest(item):
+    """Two 64-bit hashes of item."""
+    h = _mix(hash(item) & 0xFFFFFFFFFFFFFFFF)
+    return h, _mix(h)
+
+
+def _shard(digest, shards):
+    """The shard of a digest, from bits the filter does not use: BloomFilter positions start
+    at digest[0], so taking the shard from it too would give every item of a shard the same
+    first position modulo shards, and crowd the probes into a fraction of the bits."""
+    return _mix(digest[1]) % shards
+
+
+def _stable_digest(item):
+    """Two 64-bit hashes of item that are the same in every process (unlike hash of a str)."""
+    d = blake2b(repr(item).encode(), digest_size=16).digest()
+    return int.from_bytes(d[:8], 'little'), int.from_bytes(d[8:], 'little')
+
+
+class BloomFilter:
+    """A set of hashed items that never misses an added item, and wrongly reports a new one
+    as present with probability about error_rate once capacity items have been added.
+    >>> bloom = BloomFilter(100)
+    >>> bloom.add(_digest('a')), bloom.add(_digest('a')), _digest('b') in bloom
+    (False, True, False)
+    """
+
+    def __init__(self, capacity, error_rate=0.001, bits=None):
+        self.size = max(8, ceil(-capacity * log(error_rate) / log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * log(2)))
+        self.bits = bytearray(self.nbytes(capacity, error_rate)) if bits is None else bits
+
+    @staticmethod
+    def nbytes(capacity, error_rate=0.001):
+        return (max(8, ceil(-capacity * log(error_rate) / log(2) ** 2)) + 7) // 8
+
+    def _positions(self, digest):
+        h1, h2 = digest
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, digest):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(digest))
+
+    def add(self, digest):
+        """Add a digest; return whether it was (probably) present already."""
+        bits, present = self.bits, True
+        for p in self._positions(digest):
+            if not bits[p >> 3] & (1 << (p & 7)):
+                present = False
+                bits[p >> 3] |= 1 << (p & 7)
+        return present
+
+
+class ShardedSeen:
+    """already_seen for many threads: exact (by default) or, given capacity, bounded memory.
+    >>> seen = ShardedSeen()
+    >>> seen.already_seen('x'), seen.already_seen('x'), seen.already_seen('y')
+    (False, True, False)
+    >>> now = [0]
+    >>> seen = ShardedSeen(ttl=10, clock=lambda: now[0])
+    >>> seen.already_seen('x'); now[0] = 11
+    False
+    >>> seen.already_seen('x')
+    False
+    >>> seen = ShardedSeen(ttl=10, capacity=100, clock=lambda: now[0])
+    >>> seen.already_seen('x'), seen.already_seen('x')
+    (False, True)
+    >>> now[0] += 1000
+    >>> seen.already_seen('x')
+    False
+    """
+
+    def __init__(self, shards=64, ttl=None, capacity=None, error_rate=0.001, clock=monotonic):
+        self.ttl, self.clock = ttl, clock
+        self.capacity, self.error_rate = capacity, error_rate
+        self.locks = [threading.Lock() for _ in range(shards)]
+        if capacity is None:
+            self.shards = [{} for _ in range(shards)]  # item -> time last seen, oldest first
+        else:
+            # [current filter, previous filter, time current was started]; with a ttl, an item
+            # is remembered for between ttl and 2 * ttl seconds. Without one there is no
+            # previous filter.
+            self.shards = [[self._new_filter(), None, clock()] for _ in range(shards)]
+
+    def _new_filter(self):
+        return BloomFilter(ceil(self.capacity / len(self.locks)), self.error_rate)
+
+    def already_seen(self, item):
+        if self.capacity is None:
+            # mixed, so that ids with a stride spread over the shards too
+            i = _mix(hash(item) & 0xFFFFFFFFFFFFFFFF) % len(self.locks)
+            with self.locks[i]:
+                return self._seen_exact(self.shards[i], item)
+        digest = _digest(item)
+        i = _shard(digest, len(self.locks))
+        with self.locks[i]:
+            return self._seen_bloom(self.shards[i], digest)
+
+    def __contains__(self, item):
+        """Whether item would be reported as seen, without recording it."""
+        if self.capacity is None:
+            i = _mix(hash(item) & 0xFFFFFFFFFFFFFFFF) % len(self.locks)
+            with self.locks[i]:
+                last = self.shards[i].get(item)
+                return last is not None and (self.ttl is None or self.clock() - last < self.ttl)
+        digest = _digest(item)
+        i = _shard(digest, len(self.locks))
+        with self.locks[i]:
+            current, previous, started = self.shards[i]
+            if self.ttl is not None:
+                elapsed = self.clock() - started
+                if elapsed >= 2 * self.ttl:
+                    return False
+                if elapsed >= self.ttl:  # current is about to become the previous filter
+                    previous = None
+            return digest in current or (previous is not None and digest in previous)
+
+    def _seen_exact(self, shard, item):
+        now = self.clock()
+        if self.ttl is not None:
+            while shard and now - shard[next(iter(shard))] >= self.ttl:
+                del shard[next(iter(shard))]  # expire the oldest
+        found = shard.pop(item, None) is not None
+        shard[item] = now  # (re)insert at the end, keeping the oldest first
+        return found
+
+    def _seen_bloom(self, shard, digest):
+        if self.ttl is not None:
+            now = self.clock()
+            elapsed = now - shard[2]
+            if elapsed >= 2 * self.ttl:  # idle for long enough that both filters have expired
+                shard[:] = [self._new_filter(), None, now]
+            elif elapsed >= self.ttl:
+                shard[:] = [self._new_filter(), shard[0], now]
+        return shard[0].add(digest) or (shard[1] is not None and digest in shard[1])
+
+
+class SharedSeen:
+    """A Bloom-filter already_seen shared by processes, in shared memory with a lock per shard.
+
+    Items are hashed with _stable_digest, so every process agrees on their positions.
+    """
+
+    def __init__(self, capacity, error_rate=0.001, shards=16):
+        self.shard_bytes = BloomFilter.nbytes(ceil(capacity / shards), error_rate)
+        self.capacity, self.error_rate = ceil(capacity / shards), error_rate
+        self.bits = multiprocessing.Array('B', shards * self.shard_bytes, lock=False)
+        self.locks = [multiprocessing.Lock() for _ in range(shards)]
+        self._filters = None
+
+    def already_seen(self, item):
+        digest = _stable_digest(item)
+        i = _shard(digest, len(self.locks))
+        with self.locks[i]:
+            return self._views()[i].add(digest)
+
+    def __contains__(self, item):
+        """Whether item would be reported as seen, without recording it."""
+        digest = _stable_digest(item)
+        i = _shard(digest, len(self.locks))
+        with self.locks[i]:
+            return digest in self._views()[i]
+
+    def _views(self):
+        if self._filters is None:  # views of shared memory are made in each process
+            view = memoryview(self.bits).cast('B')
+            self._filters = [BloomFilter(self.capacity, self.error_rate,
+                                         view[i * self.shard_bytes:(i + 1) * self.shard_bytes])
+                             for i in range(len(self.locks))]
+        return self._filters
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_filters'] = None
+        return state
+
+
+def false_positive_rate(seen, capacity, probes=20000):
+    """Record capacity items in seen, then return the fraction of probes new items it reports
+    as present; for a Bloom-filter seen this should be near its error_rate.
+    >>> false_positive_rate(ShardedSeen(capacity=64000), 64000) < 0.002
+    True
+    >>> false_positive_rate(SharedSeen(16000), 16000) < 0.002
+    True
+    """
+    for item in range(capacity):
+        seen.already_seen(item)
+    return sum(item in seen for item in range(capacity, capacity + probes)) / probes
+
+
+def _mark_seen(seen, items, duplicates):
+    found = sum(seen.already_seen(item) for item in items)
+    with duplicates.get_lock():
+        duplicates.value += found
+
+
+def dedup_benchmark(n=200000, thread_counts=(1, 4, 16)):
+    """Print checks per second by thread count, and memory per approach, for n items."""
+    import tracemalloc
+    from time import perf_counter
+    global seen
+    approaches = [('seen_lock', lambda: None), ('ShardedSeen', ShardedSeen),
+                  ('Bloom', lambda: ShardedSeen(capacity=n))]
+    for name, make in approaches:
+        for threads in thread_counts:
+            seen, dedup = set(), make()
+            check = already_seen if dedup is None else dedup.already_seen
+
+            def work(start):
+                for item in range(start, n, threads):
+                    check(item)
+
+            workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+            start = perf_counter()
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+            print('{0:12s} {1:3d} threads: {2:9.0f} checks/s'.format(
+                name, threads, n / (perf_counter() - start)))
+        tracemalloc.start()
+        seen, dedup = set(), make()
+        check = already_seen if dedup is None else dedup.already_seen
+        for item in range(n):
+            check(item)
+        print('{0:12s} memory: {1:8.1f} MB'.format(name, tracemalloc.get_traced_memory()[0] / 1e6))
+        tracemalloc.stop()
+        seen = set()
+
+    shared, duplicates = SharedSeen(n), multiprocessing.Value('i', 0)
+    items = list(range(n // 4))
+    workers = [multiprocessing.Process(target=_mark_seen, args=(shared, items, duplicates))
+               for _ in range(4)]
+    start = perf_counter()
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+    print('SharedSeen   4 processes: {0:9.0f} checks/s, {1} of {2} duplicates found'.format(
+        n / (perf_counter() - start), duplicates.value, 3 * len(items)))
+
+
+# bulk synchronous parallel steps
+# count reads the other thread's counter, waits at the barrier so that no one writes before
+# everyone has read, then writes and waits again. With two copies of the state, step s reads one
+# copy and writes the other, and step s + 1 swaps them, so reads and writes never touch the same
+# copy and one barrier per step is enough. bsp runs this for any number of workers, each updating
+# its own slice of the state, with threads or with processes sharing the state in shared memory.
+def bsp(step, state, steps, workers=2, processes=False):
+    """Run step(read, write, lo, hi) for each worker's slice [lo, hi) of state, steps times.
+
+    step must set write[i] for every i in [lo, hi), reading only from read. Returns the final
+    state and, for each worker, a list of (compute seconds, barrier wait seconds) per step;
+    a straggler shows up as the worker with the most compute and the least waiting.
+    With processes=True, state holds floats and step must be picklable.
+    If step raises, every worker stops and bsp raises the error (with processes, RuntimeError
+    naming the failed worker, whose traceback is printed by the process itself).
+    >>> state, times = bsp(_count_step, [0, 0], 10)
+    >>> state
+    [10, 10]
+    >>> len(times), len(times[0])
+    (2, 10)
+    >>> bsp(_count_step, [0], 10)  # the second worker fails, the first is waiting for it
+    Traceback (most recent call last):
+        ...
+    IndexError: list index out of range
+    """
+    n = len(state)
+    if processes:
+        buffers = [multiprocessing.Array('d', state, lock=False) for _ in range(2)]
+        times = multiprocessing.Array('d', workers * steps * 2, lock=False)
+        barrier, spawn = multiprocessing.Barrier(workers), multiprocessing.Process
+        errors = None
+    else:
+        buffers = [list(state), list(state)]
+        times = [0.0] * (workers * steps * 2)
+        barrier, spawn = threading.Barrier(workers), threading.Thread
+        errors = []
+    bounds = [n * w // workers for w in range(workers + 1)]
+    runners = [spawn(target=_bsp_worker, args=(step, buffers, barrier, bounds[w], bounds[w + 1],
+                                               steps, times, w, errors))
+               for w in range(workers)]
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join()
+    if errors:
+        raise errors[0]
+    for w, runner in enumerate(runners):
+        if processes and runner.exitcode:
+            raise RuntimeError('bsp worker {0} exited with code {1}'.format(w, runner.exitcode))
+    per_worker = [[(times[2 * (w * steps + s)], times[2 * (w * steps + s) + 1])
+                   for s in range(steps)] for w in range(workers)]
+    return list(buffers[steps % 2]), per_worker
+
+
+def _bsp_worker(step, buffers, barrier, lo, hi, steps, times, w, errors):
+    from time import perf_counter
+    for s in range(steps):
+        start = perf_counter()
+        try:
+            step(buffers[s % 2], buffers[1 - s % 2], lo, hi)
+        except BaseException as e:
+            barrier.abort()  # the others would otherwise wait for this worker forever
+            if errors is None:
+                raise  # in a process, bsp sees the exit code
+            errors.append(e)
+            return
+        computed = perf_counter()
+        try:
+            barrier.wait()  # every slice is written before anyone reads it
+        except threading.BrokenBarrierError:
+            return  # another worker failed
+        i = 2 * (w * steps + s)
+        times[i], times[i + 1] = computed - start, perf_counter() - computed
+
+
+def _count_step(read, write, lo, hi):
+    """The step of count: each counter becomes one more than the other one was."""
+    for i in range(lo, hi):
+        write[i] = read[1 - i] + 1
+
+
+def _jacobi_step(read, write, lo, hi):
+    """Relax a 1-D heat equation: each interior point becomes the mean of its neighbours."""
+    last = len(read) - 1
+    for i in range(lo, hi):
+        write[i] = read[i] if i in (0, last) else (read[i - 1] + read[i + 1]) / 2
+
+
+def bsp_count(steps):
+    """threaded_count, on the bsp engine."""
+    state, _ = bsp(_count_step, [0, 0], steps)
+    print('counters:', state)
+
+
+def bsp_benchmark(n=100000, steps=20, worker_counts=(1, 2, 4)):
+    """Print seconds per step and the slowest worker's share of the compute time."""
+    from time import perf_counter
+    state = [100.0] + [0.0] * (n - 1)
+    for processes in (False, True):
+        for workers in worker_counts:
+            start = perf_counter()
+            _, times = bsp(_jacobi_step, state, steps, workers, processes)
+            elapsed = perf_counter() - start
+            computes = [sum(c for c, _ in worker) for worker in times]
+            print('{0:9s} {1:2d} workers: {2:7.2f} ms/step, slowest worker {3:4.0%} of compute'.format(
+                'processes' if processes else 'threads', workers, elapsed / steps * 1000,
+                max(computes) / sum(computes)))
+
+
+# counters
+# increment() loses updates because reading counter[0] and writing it back are separate steps.
+# Each counter below has the same two methods, add(n) and value(). A LockedCounter makes the
+# read-modify-write one step with a lock. A ShardedCounter gives each thread a cell of its own,
+# so that no two threads ever write the same cell, and sums the cells when read. A SharedCounter
+# lives in shared memory and can be added to from several processes.
+class RacyCounter:
+    """The unsynchronized counter of increment(), for comparison."""
+
+    def __init__(self):
+        self.count = 0
+
+    def add(self, n=1):
+        count = self.count
+        sleep(0)  # as in increment(), invites a switch between the read and the write
+        self.count = count + n
+
+    def value(self):
+        return self.count
+
+
+class LockedCounter:
+    """An exact counter; every add takes the lock."""
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, n=1):
+        with self.lock:
+            self.count += n
+
+    def value(self):
+        with self.lock:
+            return self.count
+
+
+class ShardedCounter:
+    """An exact counter with a cell per thread; only a thread's first add takes the lock.
+    >>> c = ShardedCounter()
+    >>> workers = [threading.Thread(target=lambda: [c.add() for _ in range(1000)]) for _ in range(4)]
+    >>> for t in workers: t.start()
+    >>> for t in workers: t.join()
+    >>> c.value()
+    4000
+    """
+
+    def __init__(self):
+        self.cells = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def add(self, n=1):
+        try:
+            cell = self.local.cell
+        except AttributeError:
+            cell = self.local.cell = [0]
+            with self.lock:
+                self.cells.append(cell)
+        cell[0] += n
+
+    def value(self):
+        with self.lock:
+            return sum(cell[0] for cell in self.cells)
+
+
+class SharedCounter:
+    """An exact counter in shared memory, for threads and processes alike."""
+
+    def __init__(self):
+        self.count = multiprocessing.Value('q', 0)
+
+    def add(self, n=1):
+        with self.count.get_lock():
+            self.count.value += n
+
+    def value(self):
+        return self.count.value
+
+
+def _add_many(counter, n):
+    for _ in range(n):
+        counter.add()
+
+
+def counter_benchmark(writer_counts=(1, 4, 16, 64), adds=200000):
+    """Print lost updates and adds per second for each counter and number of writers.
+
+    SharedCounter is written by processes (at most 8), the others by threads.
+    """
+    from time import perf_counter
+    for make in (RacyCounter, LockedCounter, ShardedCounter, SharedCounter):
+        spawn, counts = threading.Thread, writer_counts
+        if make is SharedCounter:
+            spawn, counts = multiprocessing.Process, sorted({min(w, 8) for w in writer_counts})
+        for writers in counts:
+            counter, each = make(), adds // writers
+            runners = [spawn(target=_add_many, args=(counter, each)) for _ in range(writers)]
+            start = perf_counter()
+            for r in runners:
+                r.start()
+            for r in runners:
+                r.join()
+            elapsed = perf_counter() - start
+            print('{0:14s} {1:2d} writers: {2:7d} lost, {3:10.0f} adds/s'.format(
+                make.__name__, writers, each * writers - counter.value(), each * writers / elapsed))
+
+
+if __name__ == '__main__':
+    race_condition()
+    synchronized_produce()
+    threaded_count(10)
+    process_produce()
+    create_detected_deadlock()  # create_deadlock() itself never returns
@@ -76,14 +76,15 @@ class Letters:
         return LetterIter(self.start, self.end)
 
 
-# The built-in `map` function takes iterable argument and return (lazy) iterators.
-caps = map(lambda x: x.upper(), Letters('b', 'k'))
-next(caps)
+def iterables_demo():
+    # The built-in `map` function takes iterable argument and return (lazy) iterators.
+    caps = map(lambda x: x.upper(), Letters('b', 'k'))
+    next(caps)
 
-# The built-in `for` statement takes iterable object, invokes its __iter__ method,
-# and then invokes __next__ method on the iterator until a StopIteration exception is raised.
-for item in Letters('b', 'k'):
-    print(item.upper())
+    # The built-in `for` statement takes iterable object, invokes its __iter__ method,
+    # and then invokes __next__ method on the iterator until a StopIteration exception is raised.
+    for item in Letters('b', 'k'):
+        print(item.upper())
 
 
 # Generator (An generator is an iterator returned by a generator function which uses `yield` statement.)
@@ -94,8 +95,118 @@ def letters_generator():
         current = chr(ord(current) + 1)
 
 
-for l in letters_generator():
-    print(l)
+def generator_demo():
+    for l in letters_generator():
+        print(l)
+
+
+# Random access (A sequence computes any element from its index, instead of from the previous one.)
+# LetterIter and letters_generator reach the k-th letter only by taking k steps. LetterRange wraps
+# a built-in range of code points, so len, indexing, slicing, `in` and reversed are all O(1).
+class LetterRange:
+    """A re-iterable range of letters, or of integers when start and end are integers.
+    >>> b_to_k = LetterRange('b', 'k')
+    >>> len(b_to_k), b_to_k[0], b_to_k[-1]
+    (9, 'b', 'j')
+    >>> b_to_k[::3]
+    LetterRange('b', 'k', 3)
+    >>> list(b_to_k[::3])
+    ['b', 'e', 'h']
+    >>> 'e' in b_to_k, 'z' in b_to_k
+    (True, False)
+    >>> ''.join(reversed(LetterRange('a', 'e')))
+    'dcba'
+    >>> it = iter(b_to_k)
+    >>> next(it), it.next_n(3), next(it)
+    ('b', ['c', 'd', 'e'], 'f')
+    >>> LetterRange(1, 10)[4]
+    5
+    """
+
+    def __init__(self, start='a', end='e', step=1):
+        self.letters = isinstance(start, str)
+        if self.letters:
+            start, end = ord(start), ord(end)
+        self.range = range(start, end, step)
+
+    def _value(self, n):
+        return chr(n) if self.letters else n
+
+    def __len__(self):
+        return len(self.range)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            r = self.range[i]
+            result = LetterRange.__new__(LetterRange)
+            result.letters, result.range = self.letters, r
+            return result
+        return self._value(self.range[i])
+
+    def __contains__(self, value):
+        if self.letters:
+            return isinstance(value, str) and len(value) == 1 and ord(value) in self.range
+        return value in self.range
+
+    def __iter__(self):
+        return LetterRangeIter(self)
+
+    def __reversed__(self):
+        return iter(self[::-1])
+
+    def __repr__(self):
+        r = self.range
+        args = [self._value(r.start), self._value(r.stop)] + ([r.step] if r.step != 1 else [])
+        return 'LetterRange({0})'.format(', '.join(map(repr, args)))
+
+
+class LetterRangeIter:
+    """An iterator over a LetterRange that can also return a block of values at once."""
+
+    def __init__(self, letter_range):
+        self.range = letter_range.range
+        self.convert = chr if letter_range.letters else int
+        self.index = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            n = self.range[self.index]
+        except IndexError:
+            raise StopIteration  # reached end of range
+        self.index += 1
+        return self.convert(n)
+
+    def next_n(self, k):
+        """Return a list of the next k values (fewer at the end of the range)."""
+        block = self.range[self.index:self.index + k]
+        self.index += len(block)
+        return list(map(self.convert, block))
+
+
+def letter_range_benchmark(n=50000):
+    """Print the time to reach the n-th letter, and to read all n letters, for each iterator."""
+    from time import perf_counter
+    end = chr(ord('a') + n)
+
+    def walk():
+        letter_iter = LetterIter('a', end)
+        for _ in range(n):
+            letter = next(letter_iter)
+        return letter
+
+    cases = [('LetterIter walk', walk),
+             ('LetterRange[k]', lambda: LetterRange('a', end)[n - 1]),
+             ('LetterIter all', lambda: list(Letters('a', end))),
+             ('LetterRange all', lambda: list(LetterRange('a', end))),
+             ('next_n all', lambda: iter(LetterRange('a', end)).next_n(n))]
+    for name, run in cases:
+        start = perf_counter()
+        run()
+        elapsed = perf_counter() - start
+        print('{0:16s} {1:9.3f} ms'.format(name, elapsed * 1000))
 
 
 # Stream (A stream is a lazily computed linked list.)
@@ -109,15 +220,25 @@ class Stream:
     5
     >>> s.rest
     Stream(5, <...>)
+    >>> s.rest.rest.rest
+    Stream.empty
+    >>> list(s)
+    [1, 5, 9]
     """
+    # without a per-instance __dict__, each forced node costs only three slots
+    __slots__ = ('first', '_compute_rest', '_rest')
 
     class empty:
         def __repr__(self):
             return 'Stream.empty'
 
+        def __iter__(self):
+            return iter(())
+
     empty = empty()
 
-    def __init__(self, first, compute_rest=lambda: empty):
+    # the lambda is evaluated when called, by which time the global name Stream exists
+    def __init__(self, first, compute_rest=lambda: Stream.empty):
         assert callable(compute_rest), 'compute_rest must be callable'
         self.first = first
         self._compute_rest = compute_rest
@@ -131,6 +252,33 @@ class Stream:
             self._compute_rest = None
         return self._rest
 
+    def __iter__(self):
+        """Return a cursor that forces one node at a time and lets passed nodes be freed."""
+        return StreamCursor(self)
+
+    def take(self, n):
+        """Return a list of the first n elements, forcing no node beyond the nth.
+        >>> integer_stream(1).take(3)
+        [1, 2, 3]
+        """
+        result, s = [], self
+        while n > 0 and s is not Stream.empty:
+            result.append(s.first)
+            n -= 1
+            if n:
+                s = s.rest
+        return result
+
+    def drop(self, n):
+        """Return the stream that remains after the first n elements.
+        >>> integer_stream(1).drop(100000)
+        Stream(100001, <...>)
+        """
+        s = self
+        while n > 0 and s is not Stream.empty:
+            s, n = s.rest, n - 1
+        return s
+
     def __repr__(self):
         return 'Stream({0}, <...>)'.format(repr(self.first))
 
@@ -159,14 +307,506 @@ def map_stream(fn, s):
 
 
 def filter_stream(fn, s):
-    """Implement filter on a lazily computed linked list."""
+    """Implement filter on a lazily computed linked list.
+
+    Rejected elements are skipped with a loop rather than a recursive call,
+    so a long run of them does not grow the stack.
+    >>> s = filter_stream(lambda x: x % 10000 == 0, integer_stream(1))
+    >>> s.first, s.rest.first
+    (10000, 20000)
+    """
+    while s is not Stream.empty and not fn(s.first):
+        s = s.rest
     if s is Stream.empty:
         return s
 
     def compute_rest():
         return filter_stream(fn, s.rest)
-    if fn(s.first):
-        return Stream(s.first, compute_rest)
+    return Stream(s.first, compute_rest)
+
+
+# Bounded memory
+# A forced node keeps its rest forever, so whoever holds the head of a stream holds every node
+# forced after it. Links only point forward, though: once nothing refers to the head, the
+# prefix before the current node can be garbage-collected. A cursor holds just the current node
+# (and optionally a window of recent nodes), so walking a stream with one takes constant memory,
+# as long as the caller does not also keep the head, e.g. `for x in integer_stream(1)` rather
+# than `positives = integer_stream(1); for x in positives`.
+from collections import deque
+
+
+class StreamCursor:
+    """An iterator over a stream that does not keep the nodes it has passed.
+
+    window is how many of the most recently returned nodes are kept for back().
+    >>> c = StreamCursor(map_stream(lambda x: x * x, integer_stream(1)), window=3)
+    >>> [next(c) for _ in range(5)]
+    [1, 4, 9, 16, 25]
+    >>> c.back(0), c.back(2)
+    (25, 9)
+    >>> c.current
+    Stream(36, <...>)
+    """
+
+    def __init__(self, s, window=0):
+        self.current = s
+        self.recent = deque(maxlen=window)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        s = self.current
+        if s is Stream.empty:
+            raise StopIteration
+        if self.recent.maxlen:
+            self.recent.append(s)
+        self.current = s.rest
+        return s.first
+
+    def back(self, i):
+        """Return the element returned i calls to next ago, for i less than window."""
+        return self.recent[-1 - i].first
+
+
+def bounded_memory_test(n=200000, limit=1 << 20):
+    """Scanning a long map/filter pipeline through a cursor must stay under limit bytes,
+    while keeping a reference to the head grows with n."""
+    import tracemalloc
+
+    def pipeline():
+        return filter_stream(lambda x: x % 3, map_stream(lambda x: x * 2, integer_stream(1)))
+
+    tracemalloc.start()
+    cursor = StreamCursor(pipeline(), window=100)
+    for _ in range(n):
+        next(cursor)
+    _, peak = tracemalloc.get_traced_memory()
+    assert peak < limit, peak
+
+    tracemalloc.reset_peak()
+    head = pipeline()
+    head.drop(n)
+    _, retained = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert retained > 10 * limit, retained
+
+
+# Block streams
+# Each element of integer_stream, map_stream and filter_stream costs a Stream object and a closure,
+# which outweighs cheap functions like x * 2. A block stream is an ordinary Stream whose elements
+# are lists of values, so the per-node cost is paid once per block. Laziness holds a block at a
+# time: forcing rest computes exactly one more block. Blocks start small, so the first values
+# arrive quickly. After that the size follows the cost of the stages downstream: the time from
+# making a block to forcing the rest is what the later stages and the consumer spent on it (so
+# block_values forces the rest only when asked for the value after the block), and the next
+# block is sized to take about target seconds, so cheap functions get large blocks and
+# expensive ones small blocks that still arrive promptly.
+from time import perf_counter
+
+
+def integer_block_stream(first, size=16, max_size=4096, target=0.002, clock=perf_counter):
+    """Increasing integers, in blocks sized to take about target seconds each downstream.
+
+    Each block is at most twice the size of the one before, and between 1 and max_size.
+    >>> s = integer_block_stream(1, size=2)
+    >>> s.first, s.rest.first
+    ([1, 2], [3, 4, 5, 6])
+    >>> now = [0.0]
+    >>> s = integer_block_stream(1, size=100, clock=lambda: now[0])
+    >>> now[0] += 0.008  # the first block took 4 times the target
+    >>> len(s.rest.first)
+    25
+    """
+    made = clock()
+
+    def compute_rest():
+        elapsed = clock() - made
+        scaled = int(size * target / elapsed) if elapsed > 0 else 2 * size
+        next_size = max(1, min(scaled, 2 * size, max_size))
+        return integer_block_stream(first + size, next_size, max_size, target, clock)
+    return Stream(list(range(first, first + size)), compute_rest)
+
+
+def map_block_stream(fn, s):
+    """Apply fn to every value of a block stream, one block per forced node."""
+    return map_stream(lambda block: list(map(fn, block)), s)
+
+
+def filter_block_stream(fn, s):
+    """Keep the values of a block stream for which fn is true, skipping blocks left empty."""
+    return filter_stream(bool, map_stream(lambda block: list(filter(fn, block)), s))
+
+
+def block_values(s):
+    """Iterate over the values of a block stream.
+    >>> evens = filter_block_stream(lambda x: x % 2 == 0, integer_block_stream(1, size=2))
+    >>> from itertools import islice
+    >>> list(islice(block_values(map_block_stream(lambda x: x * x, evens)), 4))
+    [4, 16, 36, 64]
+    """
+    while s is not Stream.empty:
+        yield from s.first
+        s = s.rest  # forced only once the consumer has taken the whole block
+
+
+def block_stream_benchmark(n=200000):
+    """Print the time to consume n values of map(filter(integers)) per element and per block."""
+    from itertools import islice
+    double, odd = lambda x: 2 * x, lambda x: x % 2
+
+    start = perf_counter()
+    total = sum(islice(map_stream(double, filter_stream(odd, integer_stream(1))), n))
+    elapsed = perf_counter() - start
+    print('per element: {0:8.1f} ms'.format(elapsed * 1000))
+
+    start = perf_counter()
+    blocks = map_block_stream(double, filter_block_stream(odd, integer_block_stream(1)))
+    assert sum(islice(block_values(blocks), n)) == total
+    elapsed = perf_counter() - start
+    print('per block:   {0:8.1f} ms'.format(elapsed * 1000))
+
+    def slow(x):  # about 20 us per value
+        end = perf_counter() + 2e-5
+        while perf_counter() < end:
+            pass
+        return x
+    for target in (0.0005, 0.002, 0.01):
+        s = map_block_stream(slow, integer_block_stream(1, target=target))
+        sizes = [len(block) for block in s.take(40)]
+        print('slow fn, target {0:6.1f} ms: block sizes settle at {1}'.format(
+            target * 1000, sizes[-5:]))
+
+
+# Stream fusion
+# map_stream(f, filter_stream(g, map_stream(h, s))) builds a node and a closure per stage per
+# element. A Pipeline only records its stages; when its stream is built, all stages run as one
+# function per element, so the only nodes created are those of the result.
+class Pipeline:
+    """A stream with a recorded sequence of map and filter stages.
+    >>> p = Pipeline(integer_stream(1)).map(lambda x: x * x).filter(lambda x: x % 2).map(str)
+    >>> p.stream().take(4)
+    ['1', '9', '25', '49']
+    >>> p.unfused().take(4)
+    ['1', '9', '25', '49']
+    """
+    skip = object()  # returned by the fused function for an element some filter rejects
+
+    def __init__(self, source, stages=()):
+        self.source = source
+        self.stages = stages
+
+    def map(self, fn):
+        return Pipeline(self.source, self.stages + (('map', fn),))
+
+    def filter(self, fn):
+        return Pipeline(self.source, self.stages + (('filter', fn),))
+
+    def fused(self):
+        """Return one function applying every stage to an element, or returning skip."""
+        stages, skip = self.stages, self.skip
+
+        def apply_stages(x):
+            for kind, fn in stages:
+                if kind == 'map':
+                    x = fn(x)
+                elif not fn(x):
+                    return skip
+            return x
+        return apply_stages
+
+    def stream(self):
+        return fused_stream(self.fused(), self.source)
+
+    def unfused(self):
+        """The same stream built from nested map_stream and filter_stream calls."""
+        s = self.source
+        for kind, fn in self.stages:
+            s = map_stream(fn, s) if kind == 'map' else filter_stream(fn, s)
+        return s
+
+
+def fused_stream(apply_stages, s):
+    """Map apply_stages over s, leaving out elements for which it returns Pipeline.skip."""
+    while s is not Stream.empty:
+        value = apply_stages(s.first)
+        if value is not Pipeline.skip:
+            break
+        s = s.rest
     else:
-        return compute_rest()
+        return s
+    rest = s
+
+    def compute_rest():
+        return fused_stream(apply_stages, rest.rest)
+    return Stream(value, compute_rest)
+
+
+def fusion_benchmark(depths=range(1, 11), n=20000):
+    """Print time and Stream nodes created to consume n elements, unfused and fused."""
+    from time import perf_counter
+    created = [0]
+    init = Stream.__init__
+
+    def counting_init(self, *args):
+        created[0] += 1
+        init(self, *args)
+
+    for depth in depths:
+        stages = tuple(('map', lambda x: x + 1) if i % 2 == 0 else ('filter', lambda x: x % 7)
+                       for i in range(depth))
+        row = []
+        for build in (Pipeline.unfused, Pipeline.stream):
+            # every run gets a fresh source, so none reads values memoized by another,
+            # and the source's nodes are counted too
+            start = perf_counter()
+            result = build(Pipeline(integer_stream(1), stages)).take(n)
+            elapsed = perf_counter() - start
+            Stream.__init__, created[0] = counting_init, 0
+            try:
+                assert build(Pipeline(integer_stream(1), stages)).take(n) == result
+            finally:
+                Stream.__init__ = init
+            row += [elapsed * 1000, created[0]]
+        print('depth {0:2d}: unfused {1:7.1f} ms {2:7d} nodes, fused {3:7.1f} ms {4:7d} nodes'.format(
+            depth, *row))
+
+
+# Asynchronous streams
+# When the next element comes from I/O, forcing Stream.rest blocks the whole process until it
+# arrives. In an AsyncStream, rest is an awaitable: the first access schedules compute_rest as an
+# asyncio task, and every later access returns the same task, so the rest is still computed once.
+from collections.abc import Awaitable  # cheaper to import than inspect.isawaitable
+
+
+class AsyncStream:
+    """A lazily computed linked list whose rest is awaited.
+    >>> import asyncio
+    >>> async def demo():
+    ...     s = await map_async_stream(lambda x: x * x, async_integer_stream(1))
+    ...     s = await filter_async_stream(lambda x: x % 2, s)
+    ...     return s.first, (await s.rest).first
+    >>> asyncio.run(demo())
+    (1, 9)
+    """
+    __slots__ = ('first', '_compute_rest', '_rest')
+    empty = Stream.empty
+
+    async def _empty():
+        return Stream.empty
+
+    def __init__(self, first, compute_rest=_empty):
+        assert callable(compute_rest), 'compute_rest must be an async function'
+        self.first = first
+        self._compute_rest = compute_rest
+        self._rest = None
+
+    @property
+    def rest(self):
+        """Return an awaitable for the rest of the stream, starting its computation if necessary."""
+        if self._compute_rest is not None:
+            self._rest = _ensure_future(self._compute_rest())
+            self._compute_rest = None
+        return self._rest
+
+    async def __aiter__(self):
+        s = self
+        del self  # hold the current node only, as StreamCursor does
+        while s is not AsyncStream.empty:
+            yield s.first
+            s = await s.rest
+
+    def __repr__(self):
+        return 'AsyncStream({0}, <...>)'.format(repr(self.first))
+
+
+def _ensure_future(coroutine):
+    """asyncio.ensure_future, imported on first use since asyncio takes long to import."""
+    global _ensure_future
+    from asyncio import ensure_future as _ensure_future  # replaces this function
+    return _ensure_future(coroutine)
+
+
+async def _call(fn, x):
+    """Call fn, which may be an ordinary or an async function."""
+    value = fn(x)
+    if isinstance(value, Awaitable):
+        value = await value
+    return value
+
+
+def async_integer_stream(first):
+    async def compute_rest():
+        return async_integer_stream(first + 1)
+    return AsyncStream(first, compute_rest)
+
+
+async def map_async_stream(fn, s):
+    """Implement map on an async stream; fn may be an async function."""
+    if s is AsyncStream.empty:
+        return s
+
+    async def compute_rest():
+        return await map_async_stream(fn, await s.rest)
+    return AsyncStream(await _call(fn, s.first), compute_rest)
+
+
+async def filter_async_stream(fn, s):
+    """Implement filter on an async stream; fn may be an async function."""
+    while s is not AsyncStream.empty and not await _call(fn, s.first):
+        s = await s.rest
+    if s is AsyncStream.empty:
+        return s
+
+    async def compute_rest():
+        return await filter_async_stream(fn, await s.rest)
+    return AsyncStream(s.first, compute_rest)
+
+
+async def prefetch_map_async_stream(fn, s, depth=4):
+    """map_async_stream that runs fn on up to depth upcoming elements concurrently.
+
+    New calls start only when the consumer awaits a rest, so no more than depth calls
+    are ever ahead of it (backpressure). An exception from fn is raised when its
+    element is reached.
+    >>> import asyncio
+    >>> async def demo():
+    ...     async def slow_square(x):
+    ...         await asyncio.sleep(0.01)
+    ...         return x * x
+    ...     s = await prefetch_map_async_stream(slow_square, async_integer_stream(1), depth=8)
+    ...     return s.first, (await s.rest).first
+    >>> asyncio.run(demo())
+    (1, 4)
+    """
+    from asyncio import ensure_future
+    pending = deque()  # tasks running fn on the next elements, in order
+    source = s
+    del s
+
+    async def next_node():
+        nonlocal source
+        while len(pending) < depth and source is not AsyncStream.empty:
+            pending.append(ensure_future(_call(fn, source.first)))
+            source = await source.rest
+        if not pending:
+            return AsyncStream.empty
+        return AsyncStream(await pending.popleft(), next_node)
+
+    return await next_node()
+
+
+def prefetch_benchmark(depths=(1, 2, 4, 8, 16, 32), n=200, latency=0.005):
+    """Print elements per second through a source with simulated latency, by prefetch depth."""
+    import asyncio
+    from time import perf_counter
+
+    async def fetch(x):
+        await asyncio.sleep(latency)
+        return x
+
+    async def consume(depth):
+        s = await prefetch_map_async_stream(fetch, async_integer_stream(0), depth)
+        count = 0
+        async for _ in s:
+            count += 1
+            if count == n:
+                break
+
+    for depth in depths:
+        start = perf_counter()
+        asyncio.run(consume(depth))
+        elapsed = perf_counter() - start
+        print('depth {0:3d}: {1:8.0f} elements/s'.format(depth, n / elapsed))
+
+
+# Parallel map
+# map_stream calls fn on one element at a time, when that element is forced. parallel_map_stream
+# hands the next lookahead elements to a pool of workers, so while the consumer looks at one
+# element, later ones are already being computed. Results still come back in stream order, and
+# nothing beyond lookahead elements past the last forced node is ever submitted.
+import weakref
+
+
+def parallel_map_stream(fn, s, workers=4, lookahead=8, processes=False):
+    """map_stream evaluating fn on a pool of threads (or processes, for CPU-bound fn).
+
+    An exception raised by fn is raised whenever its element is forced. With processes=True,
+    fn must be picklable, i.e. defined at the top level of a module.
+    >>> s = parallel_map_stream(lambda x: 10 // (3 - x), integer_stream(1))
+    >>> s.take(2)
+    [5, 10]
+    >>> s.rest.rest
+    Traceback (most recent call last):
+        ...
+    ZeroDivisionError: integer division or modulo by zero
+    >>> s.rest.rest
+    Traceback (most recent call last):
+        ...
+    ZeroDivisionError: integer division or modulo by zero
+    """
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    pool = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(workers)
+    return _ParallelMap(fn, s, pool, lookahead)()
+
+
+class _ParallelMap:
+    """The compute_rest of every node of a parallel_map_stream.
+
+    Only nodes whose rest is not yet forced refer to it, so it is collected (and the pool shut
+    down) as soon as the consumer drops the stream, even one that stops early on an infinite
+    source; or when the source runs out.
+    """
 
+    def __init__(self, fn, source, pool, lookahead):
+        self.fn = fn
+        self.source = source
+        self.pool = pool
+        self.lookahead = lookahead
+        self.pending = deque()  # futures for the next elements, in order
+        self.shutdown = weakref.finalize(self, pool.shutdown, wait=False, cancel_futures=True)
+
+    def __call__(self):
+        pending = self.pending
+        while len(pending) < self.lookahead and self.source is not Stream.empty:
+            pending.append(self.pool.submit(self.fn, self.source.first))
+            self.source = self.source.rest
+        if not pending:
+            self.shutdown()
+            return Stream.empty
+        value = pending[0].result()  # removed only once it succeeds, so a failure is raised again
+        pending.popleft()
+        return Stream(value, self)
+
+
+def _spin(n):
+    """CPU-bound work for parallel_map_benchmark."""
+    total = 0
+    for i in range(n):
+        total += i * i
+    return total
+
+
+def _wait(seconds):
+    """I/O-bound work for parallel_map_benchmark."""
+    from time import sleep
+    sleep(seconds)
+    return seconds
+
+
+def parallel_map_benchmark(worker_counts=(1, 2, 4, 8), n=64):
+    """Print the time to consume n elements for CPU-bound (processes) and I/O-bound (threads) fn."""
+    from time import perf_counter
+    for name, fn, x, processes in (('cpu', _spin, 200000, True), ('io', _wait, 0.01, False)):
+        for workers in worker_counts:
+            start = perf_counter()
+            s = parallel_map_stream(fn, map_stream(lambda _: x, integer_stream(0)),
+                                    workers, lookahead=2 * workers, processes=processes)
+            s.take(n)
+            elapsed = perf_counter() - start
+            print('{0:3s} {1:2d} workers: {2:7.1f} elements/s'.format(name, workers, n / elapsed))
+
+
+if __name__ == '__main__':
+    iterables_demo()
+    generator_demo()
@@ -0,0 +1,200 @@
+"""Run the doctests of every file, each file in its own process, with timing and a result cache.
+
+    python -m package test [-k PATTERN] [--workers N] [--timeout SECONDS] [--slowest N] [--no-cache]
+
+Each file is imported under its alias (see modules in __init__), so hyphenated names work, in a
+fresh process; at most `workers` run at once. A file that has not finished within `timeout`
+seconds is killed and reported with the example it was running, so one hang blocks nothing
+else. The wall time of every docstring's examples is reported, slowest first.
+
+A file whose tests all passed is recorded in the cache under the hash of its contents, of
+__init__ (which every file is imported through) and of this runner, and of the Python version,
+and skipped until any of them changes. Failures are never cached.
+"""
+
+import doctest
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from multiprocessing.connection import wait
+
+from . import modules
+
+_here = os.path.dirname(os.path.abspath(__file__))
+cache_file = os.path.join(_here, '.doctest-cache.json')
+
+
+def collect(pattern=None):
+    """Return {module name: file path} for every Python file of the package, except __main__.
+
+    Files in modules are named by their alias, the rest by the file name.
+    >>> collect('calculator')
+    {'ch3_interpreter_example_calculator': 'ch3-interpreter-example-calculator.py'}
+    """
+    aliases = {path: alias for alias, path in modules.items()}
+    found = {}
+    for path in sorted(os.listdir(_here)):
+        if not path.endswith('.py') or path == '__main__.py':
+            continue
+        name = aliases.get(path, path[:-3])
+        if pattern is None or re.search(pattern, name) or re.search(pattern, path):
+            found[name] = path
+    return found
+
+
+def file_key(path):
+    """The cache key of a file: a hash of its contents, of __init__ and this runner, and of
+    the Python version."""
+    digest = hashlib.sha256()
+    for name in (path, '__init__.py', os.path.basename(__file__)):
+        with open(os.path.join(_here, name), 'rb') as f:
+            digest.update(f.read())
+    digest.update(sys.version.encode())
+    return digest.hexdigest()
+
+
+def _run_module(package, name, conn):
+    """In a child process: import package.name and run its doctests one docstring at a time.
+
+    Sends ('start', test name) before each docstring, ('test', test name, attempted, failed,
+    seconds, report) after it, and finally ('done',), or ('error', traceback) if the import fails.
+    """
+    import importlib
+    import traceback
+    module_name = package if name == '__init__' else package + '.' + name
+    try:
+        module = importlib.import_module(module_name)
+    except BaseException:
+        conn.send(('error', traceback.format_exc()))
+        return
+    tests = doctest.DocTestFinder().find(module)
+    tests.sort(key=lambda test: test.name)
+    for test in tests:
+        if not test.examples:
+            continue
+        conn.send(('start', test.name))
+        report = io.StringIO()
+        runner = doctest.DocTestRunner()
+        start = time.perf_counter()
+        result = runner.run(test, out=report.write)
+        conn.send(('test', test.name, result.attempted, result.failed,
+                   time.perf_counter() - start, report.getvalue()))
+    conn.send(('done',))
+
+
+def run(pattern=None, workers=None, timeout=120.0, use_cache=True, out=sys.stdout):
+    """Run the doctests of the files matching pattern; return {name: result}.
+
+    A result is a dict with status ('ok', 'failed', 'error', 'timeout' or 'cached'),
+    seconds, and the list of (test name, attempted, failed, seconds, report) in tests.
+    """
+    package = __package__
+    if os.path.dirname(_here) not in sys.path:
+        sys.path.insert(0, os.path.dirname(_here))  # so that spawned children can import the package
+    cache = _load_cache() if use_cache else {}
+    pending = []
+    results = {}
+    for name, path in collect(pattern).items():
+        key = file_key(path)
+        if cache.get(path) == key:
+            results[name] = {'status': 'cached', 'seconds': 0.0, 'tests': [], 'path': path, 'key': key}
+            _print_result(name, results[name], out)
+        else:
+            pending.append((name, path, key))
+    workers = workers or os.cpu_count() or 1
+    running = {}  # connection -> (name, process, deadline, state)
+    while pending or running:
+        while pending and len(running) < workers:
+            name, path, key = pending.pop(0)
+            parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_run_module, args=(package, name, child_conn))
+            process.start()
+            child_conn.close()
+            state = {'status': None, 'tests': [], 'current': None, 'path': path, 'key': key,
+                     'start': time.perf_counter()}
+            running[parent_conn] = (name, process, state['start'] + timeout, state)
+        now = time.perf_counter()
+        ready = wait(list(running), max(0.0, min(d for _, _, d, _ in running.values()) - now))
+        for conn in ready:
+            name, process, deadline, state = running[conn]
+            try:
+                message = conn.recv()
+            except EOFError:  # the child died without reporting
+                process.join()
+                message = ('error', 'exited with code {0}'.format(process.exitcode))
+            if message[0] == 'start':
+                state['current'] = message[1]
+                continue
+            if message[0] == 'test':
+                state['tests'].append(message[1:])
+                state['current'] = None
+                continue
+            if message[0] == 'error':
+                state['status'], state['report'] = 'error', message[1]
+            else:
+                state['status'] = 'failed' if any(t[2] for t in state['tests']) else 'ok'
+            _finish(conn, running, results, out)
+        now = time.perf_counter()
+        for conn, (name, process, deadline, state) in list(running.items()):
+            if now >= deadline:
+                process.kill()
+                state['status'] = 'timeout'
+                state['report'] = 'timed out after {0:g} s in {1}'.format(
+                    timeout, state['current'] or 'import')
+                _finish(conn, running, results, out)
+    if use_cache:
+        for result in results.values():
+            if result['status'] == 'ok':
+                cache[result['path']] = result['key']
+            elif result['status'] != 'cached':
+                cache.pop(result['path'], None)
+        _save_cache(cache)
+    return results
+
+
+def _finish(conn, running, results, out):
+    name, process, deadline, state = running.pop(conn)
+    conn.close()
+    process.join()
+    state['seconds'] = time.perf_counter() - state.pop('start')
+    state.pop('current')
+    results[name] = state
+    _print_result(name, state, out)
+
+
+def _print_result(name, result, out):
+    if not out:
+        return
+    tests = result['tests']
+    print('{0:40s} {1:8s} {2:4d} examples {3:3d} failed {4:8.2f} s'.format(
+        name, result['status'], sum(t[1] for t in tests), sum(t[2] for t in tests),
+        result['seconds']), file=out)
+    for test in tests:
+        if test[2]:
+            print(test[4], file=out)
+    if 'report' in result:
+        print(result['report'], file=out)
+
+
+def slowest(results, n=10):
+    """The n slowest tests as (seconds, test name), slowest first."""
+    times = [(t[3], t[0]) for result in results.values() for t in result['tests']]
+    return sorted(times, reverse=True)[:n]
+
+
+def _load_cache():
+    try:
+        with open(cache_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    with open(cache_file, 'w') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
@@ -144,4 +144,6 @@ def triple(x):
     return 3 * x
 
 
-triple(12)
+if __name__ == '__main__':
+    improve_test()
+    triple(12)
@@ -57,10 +57,15 @@ def memo(fn):
             cache[n] = fn(n)
         return cache[n]
 
+    memorized.cache = cache  # so that callers can clear it
+    memorized.__wrapped__ = fn  # as functools.wraps would
     return memorized
 
 fib = memo(fib)  # the recursive called function
-assert fib(40) == 63245986
+
+
+def fib_test():
+    assert fib(40) == 63245986
 
 
 # example, counting change
@@ -73,7 +78,9 @@ def count_change(a, kinds=(50, 25, 10, 5, 1)):
     d = kinds[0]
     return count_change(a, kinds[1:]) + count_change(a - d, kinds)
 
-assert count_change(100) == 292
+
+def count_change_test():
+    assert count_change(100) == 292
 
 
 # example, exponentiation
@@ -89,3 +96,8 @@ def fast_exp(b, n):
         return square(fast_exp(b, n/2))
     else:
         return b * fast_exp(b, n-1)
+
+
+if __name__ == '__main__':
+    fib_test()
+    count_change_test()
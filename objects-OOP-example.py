@@ -64,3 +64,283 @@ def as_seen_on_tv_account_test():
     assert such_a_deal.deposit(20) == 19
     assert such_a_deal.withdraw(5) == 13
 
+
+
+# Thread-safe ledger
+# deposit and withdraw above read self.balance, compute, then write it back. Two threads switching
+# between the read and the write lose an update, the same race as increment() in
+# data-processing-parallel-computing.py. The ledger guards balances with a fixed set of striped
+# locks: account i is protected by lock i % stripes, so millions of accounts share a few hundred locks.
+import threading
+
+
+class LedgerAccount:
+    """A bare account record. __slots__ removes the per-instance __dict__."""
+    __slots__ = ('holder', 'balance')
+
+    def __init__(self, holder, balance=0):
+        self.holder = holder
+        self.balance = balance
+
+    def __repr__(self):
+        return 'LedgerAccount({0!r}, {1!r})'.format(self.holder, self.balance)
+
+
+class Ledger:
+    """Accounts addressed by integer id, safe to deposit, withdraw and transfer from many threads.
+    >>> ledger = Ledger()
+    >>> jim, sam = ledger.open('Jim'), ledger.open('Sam', 10)
+    >>> ledger.deposit(jim, 20)
+    20
+    >>> ledger.withdraw(jim, 25)
+    'insufficient balance'
+    >>> ledger.transfer(sam, jim, 10)
+    True
+    >>> ledger.balance(jim), ledger.balance(sam)
+    (30, 0)
+    >>> ledger.transfer_batch([(jim, sam, 5), (sam, jim, 6)])
+    False
+    >>> ledger.balance(jim), ledger.balance(sam)
+    (30, 0)
+    >>> ledger.transfer_batch((jim, sam, 5) for _ in range(2))
+    True
+    >>> ledger.balance(jim), ledger.balance(sam)
+    (20, 10)
+    >>> ledger.transfer(jim, sam, -50)
+    Traceback (most recent call last):
+        ...
+    ValueError: negative amount: -50
+    """
+
+    def __init__(self, stripes=256):
+        self.accounts = []
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._open_lock = threading.Lock()
+
+    def open(self, holder, balance=0):
+        """Open a new account and return its id."""
+        with self._open_lock:
+            self.accounts.append(LedgerAccount(holder, balance))
+            return len(self.accounts) - 1
+
+    def balance(self, account_id):
+        return self.accounts[account_id].balance
+
+    def total(self):
+        """Sum of all balances, read while holding every stripe."""
+        with _Locked(self._locks):
+            return sum(account.balance for account in self.accounts)
+
+    def deposit(self, account_id, amount):
+        _check_amount(amount)
+        account = self.accounts[account_id]
+        with self._locks[account_id % len(self._locks)]:
+            account.balance += amount
+            return account.balance
+
+    def withdraw(self, account_id, amount):
+        _check_amount(amount)
+        account = self.accounts[account_id]
+        with self._locks[account_id % len(self._locks)]:
+            if amount > account.balance:
+                return 'insufficient balance'
+            account.balance -= amount
+            return account.balance
+
+    def transfer(self, from_id, to_id, amount):
+        """Move amount between two accounts; return whether it happened."""
+        return self.transfer_batch([(from_id, to_id, amount)])
+
+    def transfer_batch(self, transfers):
+        """Apply a sequence of (from_id, to_id, amount) transfers atomically.
+
+        Either every transfer is applied in order, or (if any would overdraw) none is.
+        A negative amount raises ValueError before any lock is taken.
+        """
+        transfers = list(transfers)  # iterated twice: to find the locks, then to apply
+        ids = set()
+        for from_id, to_id, amount in transfers:
+            _check_amount(amount)
+            ids.update((from_id, to_id))
+        with _Locked(self._stripes(ids)):
+            balances = {i: self.accounts[i].balance for i in ids}
+            for from_id, to_id, amount in transfers:
+                if amount > balances[from_id]:
+                    return False
+                balances[from_id] -= amount
+                balances[to_id] += amount
+            for i, balance in balances.items():
+                self.accounts[i].balance = balance
+            return True
+
+    def _stripes(self, account_ids):
+        """Return the locks guarding account_ids, in one global order so that no two
+        batches can each hold a lock the other is waiting for."""
+        n = len(self._locks)
+        return [self._locks[i] for i in sorted({a % n for a in account_ids})]
+
+
+def _check_amount(amount):
+    """A negative amount would move money the wrong way past the overdraft checks."""
+    if amount < 0:
+        raise ValueError('negative amount: {0!r}'.format(amount))
+
+
+class _Locked:
+    """Context manager acquiring a list of locks in order and releasing them in reverse."""
+
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+
+    def __exit__(self, *exc):
+        for lock in reversed(self.locks):
+            lock.release()
+
+
+def ledger_stress_test(threads=8, accounts=100, transfers=20000):
+    """Random transfers from many threads must neither create nor destroy money."""
+    from random import Random
+    ledger = Ledger(stripes=16)
+    for i in range(accounts):
+        ledger.open(i, 100)
+    expected = ledger.total()
+
+    def worker(seed):
+        rand = Random(seed)
+        for _ in range(transfers // threads):
+            a, b = rand.randrange(accounts), rand.randrange(accounts)
+            if rand.random() < 0.1:
+                ledger.transfer_batch([(a, b, 3), (b, rand.randrange(accounts), 5)])
+            else:
+                ledger.transfer(a, b, rand.randrange(1, 50))
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    assert ledger.total() == expected
+    assert all(account.balance >= 0 for account in ledger.accounts)
+
+
+def ledger_benchmark(thread_counts=(1, 2, 4, 8), accounts=10000, ops=200000):
+    """Print transfers per second for each thread count."""
+    from random import Random
+    from time import perf_counter
+    for n in thread_counts:
+        ledger = Ledger()
+        for i in range(accounts):
+            ledger.open(i, 1000)
+
+        def worker(seed):
+            rand = Random(seed)
+            for _ in range(ops // n):
+                ledger.transfer(rand.randrange(accounts), rand.randrange(accounts), 1)
+
+        workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(n)]
+        start = perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = perf_counter() - start
+        print('{0:3d} threads: {1:10.0f} transfers/s'.format(n, ops / elapsed))
+
+
+# Columnar account store
+# Calling withdraw on each object looks up withdraw_charge through the MRO every time. The store
+# keeps one column per attribute (holders, class codes, balances), looks up each class's fee rules
+# once when the store is created, and then processes whole batches of rows in plain loops.
+from array import array
+
+OK, INSUFFICIENT = 0, 1
+
+
+class AccountStore:
+    """Accounts of the classes above, stored as columns.
+    >>> store = AccountStore()
+    >>> sam = store.open('Sam', CheckingAccount)
+    >>> john = store.open('John', AsSeenOnTVAccount)
+    >>> store.deposit_batch([sam, john], [10, 20])
+    [10, 19]
+    >>> list(store.withdraw_batch(iter([sam, john, sam]), [5, 5, 5]))
+    [0, 0, 1]
+    >>> store.balances
+    [4, 13]
+    >>> store.accrue_interest()
+    >>> store.balances
+    [4.04, 13.13]
+    """
+    classes = (Account, CheckingAccount, SavingsAccount, AsSeenOnTVAccount)
+
+    def __init__(self):
+        self.holders = []
+        self.kinds = array('B')
+        self.balances = []
+        # (opening balance, deposit charge, withdraw charge, interest) of each class, resolved once
+        self.rules = [(cls('').balance, getattr(cls, 'deposit_charge', 0),
+                       getattr(cls, 'withdraw_charge', 0), cls.interest) for cls in self.classes]
+
+    def open(self, holder, cls=Account):
+        """Open an account of class cls and return its row number."""
+        kind = self.classes.index(cls)
+        self.holders.append(holder)
+        self.kinds.append(kind)
+        self.balances.append(self.rules[kind][0])
+        return len(self.balances) - 1
+
+    def deposit_batch(self, rows, amounts):
+        """Deposit amounts[i] into account rows[i], in order; return the new balances."""
+        balances, kinds = self.balances, self.kinds
+        charges = [rule[1] for rule in self.rules]
+        result = []
+        for row, amount in zip(rows, amounts):
+            balances[row] += amount - charges[kinds[row]]
+            result.append(balances[row])
+        return result
+
+    def withdraw_batch(self, rows, amounts):
+        """Withdraw amounts[i] from account rows[i], in order; return a status code per row.
+
+        Rows that would overdraw are left unchanged and marked INSUFFICIENT.
+        """
+        balances, kinds = self.balances, self.kinds
+        charges = [rule[2] for rule in self.rules]
+        status = array('B')
+        for row, amount in zip(rows, amounts):
+            amount += charges[kinds[row]]
+            if amount > balances[row]:
+                status.append(INSUFFICIENT)
+            else:
+                balances[row] -= amount
+                status.append(OK)
+        return status
+
+    def accrue_interest(self):
+        """Add one period of interest to every account in a single pass."""
+        rates = [rule[3] for rule in self.rules]
+        self.balances = [b + b * rates[k] for b, k in zip(self.balances, self.kinds)]
+
+
+def account_store_test(n=1000, rows=10000):
+    """The store must agree with the per-object classes on the same random streams."""
+    from random import Random
+    rand = Random(0)
+    store = AccountStore()
+    objects = []
+    for i in range(n):
+        cls = rand.choice(AccountStore.classes)
+        store.open(i, cls)
+        objects.append(cls(i))
+    ids = [rand.randrange(n) for _ in range(rows)]
+    amounts = [rand.randrange(1, 20) for _ in range(rows)]
+    assert store.deposit_batch(ids, amounts) == [objects[i].deposit(a) for i, a in zip(ids, amounts)]
+    status = store.withdraw_batch(ids, amounts)
+    expected = [objects[i].withdraw(a) for i, a in zip(ids, amounts)]
+    assert [s == INSUFFICIENT for s in status] == [e == 'insufficient balance' for e in expected]
+    store.accrue_interest()
+    assert store.balances == [a.balance + a.balance * a.interest for a in objects]